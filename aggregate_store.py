@@ -0,0 +1,421 @@
+import copy
+import hashlib
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['age', 'bmi', 'children', 'charges']
+CATEGORICAL_COLUMNS = ['sex', 'smoker', 'region']
+COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region', 'charges']
+
+COLUMNAR_EXTENSIONS = ('.parquet', '.pq', '.feather', '.arrow')
+DATA_EXTENSIONS = ('.csv',) + COLUMNAR_EXTENSIONS
+
+# Bytes of a CSV file hashed to notice that it was rewritten rather than appended to
+HEAD_BYTES = 4096
+# CSV bytes parsed per step when catching up on a large delta
+READ_BLOCK_BYTES = 64 << 20
+
+
+def dataset_files(path):
+    """The data files behind `path`: the file itself, or every data file in a directory."""
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.lower().endswith(DATA_EXTENSIONS) and not name.startswith('.')
+    )
+
+
+def is_columnar(path):
+    return path.lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def read_columnar(path, columns=COLUMNS):
+    if path.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (log-spaced buckets).
+
+    A value x > 0 is counted in bucket ceil(log_gamma(x)), so every order
+    statistic is known to within `relative_accuracy`. Memory grows with
+    log(max / min), not with the row count.
+    """
+
+    def __init__(self, relative_accuracy=0.005):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_keys(self, store, magnitudes):
+        if len(magnitudes) == 0:
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.zeros += int(np.count_nonzero(values == 0))
+        self._add_keys(self.positive, values[values > 0])
+        self._add_keys(self.negative, -values[values < 0])
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _value_at_rank(self, rank):
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def quantile(self, q):
+        """Linearly interpolated between the neighbouring order statistics, like pandas."""
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        low = self._value_at_rank(np.floor(rank))
+        high = self._value_at_rank(np.ceil(rank))
+        return low + (rank - np.floor(rank)) * (high - low)
+
+
+class ColumnStats:
+    """Count, mean, centered sum of squares (M2), min, max and a quantile sketch of one column.
+
+    Batches are folded in with Chan et al.'s parallel update, so the variance
+    stays accurate however many rows have been seen.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sketch.add(values)
+
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+class CoMoments:
+    """Mean vector and co-moment matrix of the numeric columns, merged batch by batch."""
+
+    def __init__(self, n_columns):
+        self.count = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros((n_columns, n_columns))
+
+    def add(self, X):
+        X = X[~np.isnan(X).any(axis=1)]
+        n = len(X)
+        if n == 0:
+            return
+        mean = X.mean(axis=0)
+        centered = X - mean
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += centered.T @ centered + np.outer(delta, delta) * (self.count * n / total)
+        self.mean += delta * (n / total)
+        self.count = total
+
+    def correlation(self):
+        scale = np.sqrt(np.diag(self.m2))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.m2 / np.outer(scale, scale)
+
+
+class AppendedRows:
+    """State built from a dataset's rows and fed only what was appended.
+
+    Tracks how far every data file has been read (byte offset for CSV files,
+    size and mtime for immutable Parquet/Feather batches). `refresh()` passes
+    only what was appended since to `_add`, so its cost follows the delta
+    rather than the history. A file that was rewritten, truncated or removed
+    triggers a full rebuild (`_clear`, then every row again). Subclasses
+    implement `_clear()` and `_add(frame)`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.files = {}
+        self.rows = 0
+        self.generation += 1
+        self._clear()
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _add(self, frame):
+        raise NotImplementedError
+
+    def _version(self):
+        files = tuple(
+            (os.path.basename(file), state['size'], state['mtime']) if state['columnar']
+            else (os.path.basename(file), state['offset'])
+            for file, state in sorted(self.files.items())
+        )
+        return (os.path.abspath(self.path), self.generation, files)
+
+    def version(self):
+        """Identifies exactly the rows read so far; changes with every append or rebuild."""
+        with self._lock:
+            return self._version()
+
+    # Reading deltas
+
+    def _head_digest(self, file, length):
+        with open(file, 'rb') as f:
+            return hashlib.sha256(f.read(length)).hexdigest()
+
+    def _rewritten(self, file):
+        state = self.files[file]
+        stat = os.stat(file)
+        if state['columnar']:
+            return (stat.st_size, stat.st_mtime_ns) != (state['size'], state['mtime'])
+        if stat.st_size < state['offset']:
+            return True
+        length = min(state['offset'], HEAD_BYTES)
+        return self._head_digest(file, length) != state['head']
+
+    def _new_rows(self, file):
+        """Yield frames of the rows of `file` not seen yet."""
+        if is_columnar(file):
+            if file in self.files:
+                return
+            stat = os.stat(file)
+            frame = read_columnar(file)
+            self.files[file] = {'columnar': True, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+            yield frame
+            return
+
+        state = self.files.setdefault(file, {'columnar': False, 'offset': 0, 'header': b'', 'head': None})
+        with open(file, 'rb') as f:
+            f.seek(state['offset'])
+            pending = b''
+            while True:
+                block = f.read(READ_BLOCK_BYTES)
+                if not block:
+                    break
+                data = pending + block
+                # Only whole lines; a partially written last line is read next time
+                end = data.rfind(b'\n') + 1
+                pending = data[end:]
+                data = data[:end]
+                if not data:
+                    continue
+                if not state['header']:
+                    header_end = data.index(b'\n') + 1
+                    state['header'] = data[:header_end]
+                    data = data[header_end:]
+                    state['offset'] += header_end
+                    if not data:
+                        continue
+                frame = pd.read_csv(io.BytesIO(state['header'] + data), usecols=COLUMNS)
+                state['offset'] += len(data)
+                yield frame
+        state['head'] = self._head_digest(file, min(state['offset'], HEAD_BYTES))
+
+    def refresh(self):
+        """Fold newly appended rows in; returns how many were added."""
+        with self._lock:
+            files = dataset_files(self.path)
+            if set(self.files) - set(files) or any(self._rewritten(file) for file in files if file in self.files):
+                self.reset()
+            added = 0
+            for file in files:
+                for frame in self._new_rows(file):
+                    self._add(frame)
+                    self.rows += len(frame)
+                    added += len(frame)
+            return added
+
+
+class AggregateStore:
+    """Dashboard aggregates updated block by block from appended rows.
+
+    Per-group column statistics, crosstab counts and the co-moments behind
+    the correlation matrix are folded in from each block passed to `add`.
+    `DatasetFrame` feeds its store from the same parsed blocks as its frame.
+    """
+
+    def __init__(self):
+        # group column -> group value -> numeric column -> ColumnStats
+        self.groups = {column: {} for column in CATEGORICAL_COLUMNS}
+        # categorical column -> {(value, region): count}
+        self.crosstabs = {column: {} for column in CATEGORICAL_COLUMNS}
+        self.comoments = CoMoments(len(NUMERIC_COLUMNS))
+
+    def add(self, frame):
+        frame = frame[COLUMNS].copy()
+        for column in CATEGORICAL_COLUMNS:
+            frame[column] = frame[column].astype(str).str.lower()
+        for column in NUMERIC_COLUMNS:
+            frame[column] = frame[column].astype(np.float64)
+
+        for group_column in CATEGORICAL_COLUMNS:
+            groups = self.groups[group_column]
+            for value, rows in frame.groupby(group_column, sort=False):
+                stats = groups.setdefault(value, {column: ColumnStats() for column in NUMERIC_COLUMNS})
+                for column in NUMERIC_COLUMNS:
+                    stats[column].add(rows[column].to_numpy())
+
+            pairs = pd.DataFrame({'value': frame[group_column], 'region': frame['region']}).value_counts()
+            table = self.crosstabs[group_column]
+            for key, count in pairs.items():
+                table[key] = table.get(key, 0) + int(count)
+
+        self.comoments.add(frame[NUMERIC_COLUMNS].to_numpy())
+
+    # Dashboard tables (same layout as the pandas expressions they replace)
+
+    def describe(self, group_column, column):
+        """`df.groupby(group_column)[column].describe()`, quartiles from the sketch."""
+        rows = {}
+        for value in sorted(self.groups[group_column]):
+            stats = self.groups[group_column][value][column]
+            rows[value] = {
+                'count': float(stats.count),
+                'mean': stats.mean,
+                'std': stats.std(),
+                'min': stats.min,
+                '25%': stats.sketch.quantile(0.25),
+                '50%': stats.sketch.quantile(0.5),
+                '75%': stats.sketch.quantile(0.75),
+                'max': stats.max,
+            }
+        summary = pd.DataFrame.from_dict(rows, orient='index')
+        summary.index.name = group_column
+        return summary
+
+    def grouped(self, group_column, column):
+        """`df.groupby(group_column)[column].agg(['mean', 'median', 'std', 'count'])`."""
+        summary = self.describe(group_column, column)
+        return pd.DataFrame({
+            'mean': summary['mean'],
+            'median': summary['50%'],
+            'std': summary['std'],
+            'count': summary['count'].astype(np.int64),
+        })
+
+    def crosstab(self, column):
+        """`pd.crosstab(df[column], df['region'], margins=True)`."""
+        counts = pd.Series(self.crosstabs[column], dtype=np.int64)
+        table = counts.unstack(fill_value=0).sort_index().sort_index(axis=1)
+        table.index.name = column
+        table.columns.name = 'region'
+        table['All'] = table.sum(axis=1)
+        table.loc['All'] = table.sum(axis=0)
+        return table
+
+    def correlation(self):
+        """Pearson correlation of the numeric columns."""
+        return pd.DataFrame(self.comoments.correlation(), index=NUMERIC_COLUMNS, columns=NUMERIC_COLUMNS)
+
+
+def concat_categorical(frames):
+    """Concatenate frames whose categorical columns may have different categories.
+
+    The categories are unified first, so the result keeps integer codes
+    instead of falling back to object columns.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    categories = {column: sorted(set().union(*(frame[column].cat.categories for frame in frames)))
+                  for column in CATEGORICAL_COLUMNS}
+    unified = []
+    for frame in frames:
+        changed = {}
+        for column in CATEGORICAL_COLUMNS:
+            if list(frame[column].cat.categories) != categories[column]:
+                changed[column] = frame[column].cat.set_categories(categories[column])
+        unified.append(frame.assign(**changed) if changed else frame)
+    return pd.concat(unified, ignore_index=True)
+
+
+class DatasetFrame(AppendedRows):
+    """The dataset as one DataFrame plus its aggregates, extended with appended rows.
+
+    Each appended block is parsed once and feeds both the frame and an
+    `AggregateStore`. Categorical columns are stored as `category`;
+    `prepare(frame)` (derived columns, say) runs on each new block only.
+    `snapshot()` returns the frame, the aggregates and the version they both
+    hold, so the tables and everything cached under that version match the
+    same rows. Frames and stores handed out are never modified; an append
+    builds new ones.
+    """
+
+    def __init__(self, path, prepare=None):
+        self.prepare = prepare
+        super().__init__(path)
+
+    def _clear(self):
+        self._frame = None
+        self._blocks = []
+        self._aggregates = AggregateStore()
+        self._published = None
+
+    def _add(self, frame):
+        self._aggregates.add(frame)
+        self._published = None
+        frame = frame[COLUMNS].astype({column: 'category' for column in CATEGORICAL_COLUMNS})
+        if self.prepare:
+            frame = self.prepare(frame)
+        self._blocks.append(frame)
+
+    def snapshot(self):
+        """(frame, aggregates, version) as of the last `refresh()`."""
+        with self._lock:
+            if self._blocks:
+                frames = ([self._frame] if self._frame is not None else []) + self._blocks
+                self._frame = concat_categorical(frames)
+                self._blocks = []
+            if self._frame is None:
+                frame = pd.DataFrame({column: pd.Series(dtype='category' if column in CATEGORICAL_COLUMNS
+                                                        else np.float64) for column in COLUMNS})
+                self._frame = self.prepare(frame) if self.prepare else frame
+            if self._published is None:
+                self._published = copy.deepcopy(self._aggregates)
+            return self._frame, self._published, self._version()
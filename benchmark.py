@@ -0,0 +1,389 @@
+"""Latency and throughput benchmarks for the prediction API.
+
+Drives the FastAPI `app` in-process (httpx ASGI transport) or over a local
+uvicorn socket with inputs sampled from insurance.csv. For every model type
+it measures single-row latency percentiles, batch throughput at several
+batch sizes and throughput/latency at increasing concurrency, plus peak RSS.
+Results are written as JSON; pass an earlier result with --baseline to flag
+regressions (exit status 1).
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --mode socket --workers 2 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+MODEL_TYPES = ['xgboost', 'decision_tree', 'random_forest', 'linear', 'polynomial']
+FEATURE_COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region']
+
+
+def sample_records(path, n, seed):
+    """Draw `n` rows from the dataset, jittering bmi so rows are rarely repeated."""
+    import pandas as pd
+    df = pd.read_csv(path, usecols=FEATURE_COLUMNS)
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), size=n)]
+    bmi = np.round(rows['bmi'].to_numpy() + rng.uniform(-0.5, 0.5, size=n), 2)
+    return [
+        {
+            'age': int(row.age),
+            'sex': row.sex,
+            'bmi': float(row_bmi),
+            'children': int(row.children),
+            'smoker': row.smoker,
+            'region': row.region,
+        }
+        for row, row_bmi in zip(rows.itertuples(index=False), bmi)
+    ]
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000.0
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+        'mean_ms': round(float(ms.mean()), 4),
+    }
+
+
+async def post(client, path, body):
+    start = time.perf_counter()
+    response = await client.post(path, json=body)
+    elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+    return elapsed
+
+
+async def bench_single(client, records, model_type, n_requests, warmup):
+    for record in records[:warmup]:
+        await post(client, "/predict", {**record, 'model_type': model_type})
+    latencies = [
+        await post(client, "/predict", {**records[i % len(records)], 'model_type': model_type})
+        for i in range(n_requests)
+    ]
+    return percentiles(latencies)
+
+
+async def bench_batch(client, records, model_type, sizes, repeat):
+    results = {}
+    for size in sizes:
+        body = {'records': [
+            {**records[i % len(records)], 'model_type': model_type} for i in range(size)
+        ]}
+        await post(client, "/predict/batch", body)
+        latencies = [await post(client, "/predict/batch", body) for _ in range(repeat)]
+        median = float(np.median(latencies))
+        results[str(size)] = {
+            'rows_per_s': round(size / median, 1),
+            **percentiles(latencies),
+        }
+    return results
+
+
+async def bench_concurrency(client, records, model_type, levels, n_requests):
+    results = {}
+    for level in levels:
+        latencies = []
+        next_index = iter(range(n_requests))
+
+        async def worker():
+            for i in next_index:
+                body = {**records[i % len(records)], 'model_type': model_type}
+                latencies.append(await post(client, "/predict", body))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(level)))
+        elapsed = time.perf_counter() - start
+        results[str(level)] = {
+            'requests_per_s': round(n_requests / elapsed, 1),
+            **percentiles(latencies),
+        }
+    return results
+
+
+class InProcessTarget:
+    """The app in this process; models are loaded up front instead of via lifespan."""
+
+    def __init__(self, models, env):
+        self.models = models
+        self.env = env
+        self.client = None
+
+    async def __aenter__(self):
+        os.environ.update(self.env)
+        import prediction_handler
+        # Per-request log lines would dominate the measurements
+        logging.getLogger().setLevel(logging.WARNING)
+        loaded = prediction_handler.load_models(self.models)
+        missing = [name for name in self.models if name not in loaded]
+        if missing:
+            raise RuntimeError(f"Could not load models: {', '.join(missing)}")
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=prediction_handler.app), base_url="http://benchmark"
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+
+    def peak_rss_mb(self):
+        from model_store import process_memory
+        return process_memory().get('peak_rss_mb')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+class SocketTarget:
+    """`prediction_handler.py` served by uvicorn in a subprocess on a free local port."""
+
+    def __init__(self, models, env, workers, max_connections, startup_timeout=300):
+        self.models = models
+        self.env = env
+        self.workers = workers
+        self.max_connections = max_connections
+        self.startup_timeout = startup_timeout
+        self.process = None
+        self.client = None
+
+    async def __aenter__(self):
+        port = _free_port()
+        env = {**os.environ, **self.env, 'PRELOAD_MODELS': ",".join(self.models)}
+        self.process = subprocess.Popen(
+            [sys.executable, "prediction_handler.py", "--host", "127.0.0.1",
+             "--port", str(port), "--workers", str(self.workers)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.client = httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=60,
+            limits=httpx.Limits(max_connections=self.max_connections)
+        )
+        await self._wait_ready()
+        return self
+
+    async def _wait_ready(self):
+        # Every worker loads its own models, so wait until several /ready
+        # calls in a row (likely spread over the workers) succeed
+        deadline = time.monotonic() + self.startup_timeout
+        streak = 0
+        while streak < 4 * self.workers:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {self.process.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not become ready in time")
+            try:
+                ready = (await self.client.get("/ready")).status_code == 200
+            except httpx.TransportError:
+                ready = False
+            streak = streak + 1 if ready else 0
+            await asyncio.sleep(0.05 if ready else 0.5)
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def peak_rss_mb(self):
+        """Sum of the peak RSS of the server and its worker processes."""
+        total = 0.0
+        for pid in _process_tree(self.process.pid):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            total += int(line.split()[1]) / 1024
+            except OSError:
+                pass
+        return round(total, 1) if total else None
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'mode': args.mode,
+        'workers': args.workers if args.mode == 'socket' else 1,
+        'prediction_cache': args.cache,
+        'seed': args.seed,
+    }
+
+
+async def run(args):
+    models = MODEL_TYPES if args.models == 'all' else [name.strip() for name in args.models.split(',')]
+    unknown = [name for name in models if name not in MODEL_TYPES]
+    if unknown:
+        raise SystemExit(f"Unknown model types: {', '.join(unknown)}")
+
+    n_records = max(args.requests, max(args.batch_sizes), args.concurrent_requests)
+    records = sample_records(args.data, n_records, args.seed)
+    # Distinct inputs would mostly miss anyway; disabling the cache keeps
+    # results comparable between runs unless it is what is being measured
+    env = {'PREDICTION_CACHE_SIZE': os.environ.get('PREDICTION_CACHE_SIZE', '100000') if args.cache else '0'}
+
+    if args.mode == 'socket':
+        target = SocketTarget(models, env, args.workers, max(args.concurrency))
+    else:
+        target = InProcessTarget(models, env)
+
+    results = {}
+    async with target:
+        for model_type in models:
+            print(f"Benchmarking {model_type} ...", file=sys.stderr)
+            results[model_type] = {
+                'single': await bench_single(target.client, records, model_type, args.requests, args.warmup),
+                'batch': await bench_batch(target.client, records, model_type, args.batch_sizes, args.repeat),
+                'concurrency': await bench_concurrency(
+                    target.client, records, model_type, args.concurrency, args.concurrent_requests
+                ),
+            }
+        peak_rss = target.peak_rss_mb()
+
+    return {'environment': environment(args), 'models': results, 'peak_rss_mb': peak_rss}
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+# Metrics a baseline comparison gates on: p50 and mean latency swing with
+# scheduling noise and are left to the tail percentiles
+GATED_LATENCIES = ('p95_ms', 'p99_ms')
+
+
+def compare(current, baseline, tolerance, min_latency_ms=0.0):
+    """Return (metric, baseline, current, relative change) for every regression.
+
+    Throughput (`*_per_s`) regresses when it drops by more than `tolerance`;
+    p95/p99 latency and peak RSS when they grow by more than `tolerance`.
+    Latency growth below `min_latency_ms` is ignored as noise.
+    """
+    base = flatten({'models': baseline.get('models', {}), 'peak_rss_mb': baseline.get('peak_rss_mb')})
+    regressions = []
+    for metric, value in flatten({'models': current['models'], 'peak_rss_mb': current['peak_rss_mb']}).items():
+        reference = base.get(metric)
+        if not reference:
+            continue
+        latency = metric.endswith(GATED_LATENCIES)
+        if not (latency or metric.endswith('_per_s') or metric == 'peak_rss_mb'):
+            continue
+        if latency and value - reference < min_latency_ms:
+            continue
+        change = (value - reference) / reference
+        worse = -change if metric.endswith('_per_s') else change
+        if worse > tolerance:
+            regressions.append((metric, reference, value, change))
+    return regressions
+
+
+def print_summary(result):
+    for model_type, stats in result['models'].items():
+        single = stats['single']
+        best_batch = max(stats['batch'].items(), key=lambda item: item[1]['rows_per_s'])
+        best_level = max(stats['concurrency'].items(), key=lambda item: item[1]['requests_per_s'])
+        print(
+            f"{model_type:>14}: single p50 {single['p50_ms']:.2f}ms p99 {single['p99_ms']:.2f}ms | "
+            f"batch {best_batch[1]['rows_per_s']:,.0f} rows/s @ {best_batch[0]} | "
+            f"{best_level[1]['requests_per_s']:,.0f} req/s @ concurrency {best_level[0]}",
+            file=sys.stderr
+        )
+    print(f"peak RSS: {result['peak_rss_mb']} MB", file=sys.stderr)
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the insurance prediction API")
+    parser.add_argument("--mode", choices=["inprocess", "socket"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="Server workers (socket mode)")
+    parser.add_argument("--models", default="all", help="Comma-separated model types, or 'all'")
+    parser.add_argument("--data", default="insurance.csv", help="Dataset inputs are sampled from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=500, help="Sequential single-row requests")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5, help="Requests per batch size")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4, 16, 64])
+    parser.add_argument("--concurrent-requests", type=int, default=500,
+                        help="Requests per concurrency level")
+    parser.add_argument("--cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Relative change tolerated before a metric counts as a regression")
+    parser.add_argument("--min-latency-ms", type=float, default=0.5,
+                        help="Latency increases smaller than this never count as a regression")
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print_summary(result)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        env, base_env = result['environment'], baseline.get('environment', {})
+        for field in ('mode', 'workers', 'cpu_count', 'prediction_cache'):
+            if base_env.get(field) != env[field]:
+                print(f"warning: baseline {field}={base_env.get(field)!r}, this run {env[field]!r}",
+                      file=sys.stderr)
+        regressions = compare(result, baseline, args.tolerance, args.min_latency_ms)
+        for metric, reference, value, change in regressions:
+            print(f"REGRESSION {metric}: {reference} -> {value} ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
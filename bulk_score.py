@@ -0,0 +1,216 @@
+"""Score insurance.csv-shaped CSV or Parquet files offline.
+
+Reads the input in bounded-memory chunks, scores the chunks on a process
+pool with the same `preprocess_input`/`make_prediction` path as the API, and
+writes one `prediction_<model>` column per model type in input order.
+
+    python bulk_score.py insurance.csv predictions.csv --models all --workers 4
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region']
+# Echoed input columns written as float64 to Parquet; any other input column is a string
+NUMERIC_INPUT_COLUMNS = frozenset(['age', 'bmi', 'children', 'charges'])
+
+# Set in each worker process by `init_worker`
+handler = None
+model_names = None
+
+
+def init_worker(names, log_level, threads):
+    """Load the requested models once per worker process."""
+    global handler, model_names
+    import prediction_handler
+    logging.getLogger().setLevel(log_level)
+    handler = prediction_handler
+    model_names = list(names)
+    loaded = handler.load_models(model_names)
+    missing = [name for name in model_names if name not in loaded]
+    if missing:
+        raise RuntimeError(f"Could not load models: {', '.join(missing)}")
+    # Split the cores between workers instead of letting every XGBoost
+    # booster use all of them
+    if 'xgboost' in handler.MODELS:
+        handler.MODELS['xgboost'].set_param({'nthread': threads})
+
+
+def score_chunk(chunk):
+    """Return a frame of predictions for one chunk; invalid rows get NaN."""
+    features = chunk[FEATURE_COLUMNS].copy()
+    for column in handler.categorical_features:
+        features[column] = features[column].astype(str).str.strip().str.lower()
+    # Non-numeric cells (e.g. bmi "abc") become NaN and invalidate only their row
+    for column in handler.numeric_features:
+        features[column] = pd.to_numeric(features[column], errors='coerce')
+
+    valid = features[handler.numeric_features].notna().all(axis=1).to_numpy().copy()
+    for column, categories in zip(handler.categorical_features, handler.encoder.categories_):
+        valid &= features[column].isin(categories).to_numpy()
+
+    predictions = pd.DataFrame(index=chunk.index)
+    X = handler.preprocess_input(features[valid]) if valid.any() else None
+    for name in model_names:
+        column = np.full(len(chunk), np.nan)
+        if X is not None:
+            model_type = handler.ModelType(name)
+            column[valid] = np.expm1(handler.make_prediction(handler.MODELS[name], X, model_type))
+        predictions[f"prediction_{name}"] = column
+    return predictions, int((~valid).sum())
+
+
+def read_chunks(path, chunk_size, keep_input):
+    """Yield DataFrames of at most `chunk_size` rows without loading the whole file."""
+    if path.endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+        # Column pruning: only the feature columns are read unless the input is echoed
+        columns = None if keep_input else FEATURE_COLUMNS
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = None if keep_input else FEATURE_COLUMNS
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=usecols)
+
+
+def input_columns(path):
+    """Column names of the input file, read without loading any rows."""
+    if path.endswith(('.parquet', '.pq')):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def output_schema(columns, names):
+    """Parquet schema of the output: echoed input columns, then one float64 prediction per model.
+
+    Fixed up front, so a chunk whose malformed cells changed the inferred
+    type of an input column still matches the file being written.
+    """
+    import pyarrow as pa
+    fields = [pa.field(column, pa.float64() if column in NUMERIC_INPUT_COLUMNS else pa.string())
+              for column in columns]
+    fields += [pa.field(f"prediction_{name}", pa.float64()) for name in names]
+    return pa.schema(fields)
+
+
+class OutputWriter:
+    """Append chunks to a CSV or Parquet file in the order they are written.
+
+    Parquet chunks are cast to `schema`; numeric input cells that do not
+    parse are written as nulls, as their rows are not scored either.
+    """
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.parquet = path.endswith(('.parquet', '.pq'))
+        self.schema = schema
+        self.writer = None
+        self.first = True
+
+    def write(self, frame):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            frame = frame.assign(**{
+                column: pd.to_numeric(frame[column], errors='coerce').astype(np.float64)
+                for column in frame.columns if column in NUMERIC_INPUT_COLUMNS
+            })
+            table = pa.Table.from_pandas(frame, preserve_index=False).replace_schema_metadata(None)
+            table = table.cast(self.schema)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            self.writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def run(args):
+    import prediction_handler
+    names = list(prediction_handler.MODEL_LOADERS) if args.models == 'all' else [
+        name.strip() for name in args.models.split(',')
+    ]
+    unknown = [name for name in names if name not in prediction_handler.MODEL_LOADERS]
+    if unknown:
+        raise SystemExit(f"Unknown model types: {', '.join(unknown)}")
+
+    log_level = getattr(logging, args.log_level.upper())
+    threads = max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    writer = OutputWriter(args.output)
+    if writer.parquet:
+        writer.schema = output_schema(input_columns(args.input) if args.include_input else [], names)
+    rows = 0
+    invalid = 0
+    start = time.perf_counter()
+
+    def emit(chunk, result):
+        nonlocal rows, invalid
+        predictions, n_invalid = result
+        if args.include_input:
+            predictions = pd.concat([chunk, predictions], axis=1)
+        writer.write(predictions)
+        rows += len(chunk)
+        invalid += n_invalid
+        elapsed = time.perf_counter() - start
+        print(f"\r{rows:,} rows scored ({rows / elapsed:,.0f} rows/s)", end="", file=sys.stderr, flush=True)
+
+    try:
+        chunks = read_chunks(args.input, args.chunk_size, args.include_input)
+        if args.workers <= 1:
+            init_worker(names, log_level, threads)
+            for chunk in chunks:
+                emit(chunk, score_chunk(chunk))
+        else:
+            # Keep a bounded number of chunks in flight and emit them in input order
+            with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                     initargs=(names, log_level, threads)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append((chunk, pool.submit(score_chunk, chunk)))
+                    if len(pending) >= 2 * args.workers:
+                        chunk, future = pending.popleft()
+                        emit(chunk, future.result())
+                while pending:
+                    chunk, future = pending.popleft()
+                    emit(chunk, future.result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+    print(
+        f"Scored {rows:,} rows with {', '.join(names)} in {elapsed:.2f}s "
+        f"({rows / elapsed if elapsed else 0:,.0f} rows/s); {invalid:,} invalid rows -> {args.output}",
+        file=sys.stderr
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score insurance.csv-shaped CSV/Parquet files")
+    parser.add_argument("input", help="CSV or Parquet file with the insurance.csv columns")
+    parser.add_argument("output", help="Output CSV or Parquet file")
+    parser.add_argument("--models", default="xgboost",
+                        help="Comma-separated model types, or 'all' (default: xgboost)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Scoring processes (1 scores in-process)")
+    parser.add_argument("--include-input", action="store_true",
+                        help="Copy the input columns into the output")
+    parser.add_argument("--log-level", default="warning")
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class CompiledEncoder:
+    """Pandas-free replacement for the fitted one-hot encoding in `preprocess_input`.
+
+    Built once from a fitted `OneHotEncoder`; maps raw records straight into a
+    float64 feature matrix laid out as the numeric columns followed by the
+    one-hot columns in `get_feature_names_out` order.
+    """
+
+    def __init__(self, encoder, categorical_features, numeric_features):
+        self.categorical_features = list(categorical_features)
+        self.numeric_features = list(numeric_features)
+
+        drop_idx = getattr(encoder, 'drop_idx_', None)
+        column = len(self.numeric_features)
+        self.lookups = []
+        self.categories = {}
+        for i, (feature, categories) in enumerate(zip(self.categorical_features, encoder.categories_)):
+            dropped = None if drop_idx is None or drop_idx[i] is None else int(drop_idx[i])
+            lookup = {}
+            for j, category in enumerate(categories):
+                if j == dropped:
+                    lookup[category] = None
+                else:
+                    lookup[category] = column
+                    column += 1
+            self.lookups.append((feature, lookup))
+            self.categories[feature] = [str(c) for c in categories]
+
+        self.n_features = column
+        self.feature_names = self.numeric_features + list(
+            encoder.get_feature_names_out(self.categorical_features)
+        )
+
+    def column_features(self):
+        """Input feature behind every encoded column, in column order."""
+        features = list(self.numeric_features)
+        for feature, lookup in self.lookups:
+            features.extend(feature for column in lookup.values() if column is not None)
+        return features
+
+    def allocate(self, n_rows):
+        """Return an uninitialized buffer suitable for `out=`."""
+        return np.empty((n_rows, self.n_features), dtype=np.float64)
+
+    def _check_out(self, out, n_rows):
+        if out is None:
+            return self.allocate(n_rows)
+        if out.shape[0] < n_rows or out.shape[1] != self.n_features or out.dtype != np.float64:
+            raise ValueError(
+                f"Output buffer must be float64 with at least {n_rows} rows "
+                f"and {self.n_features} columns"
+            )
+        return out[:n_rows]
+
+    def _unknown(self, feature, value):
+        return ValueError(f"Found unknown category {value!r} for feature {feature!r}")
+
+    def encode_row(self, user_input, out=None):
+        """Encode one record (a mapping of feature -> value) into a (1, n_features) row."""
+        row = self._check_out(out, 1)
+        values = row[0]
+        values[:] = 0.0
+        for i, feature in enumerate(self.numeric_features):
+            values[i] = user_input[feature]
+        for feature, lookup in self.lookups:
+            value = user_input[feature]
+            if value not in lookup:
+                raise self._unknown(feature, value)
+            column = lookup[value]
+            if column is not None:
+                values[column] = 1.0
+        return row
+
+    def encode_records(self, records, out=None):
+        """Encode a sequence of records into an (n_rows, n_features) matrix."""
+        X = self._check_out(out, len(records))
+        X[:, len(self.numeric_features):] = 0.0
+        for r, user_input in enumerate(records):
+            values = X[r]
+            for i, feature in enumerate(self.numeric_features):
+                values[i] = user_input[feature]
+            for feature, lookup in self.lookups:
+                value = user_input[feature]
+                if value not in lookup:
+                    raise self._unknown(feature, value)
+                column = lookup[value]
+                if column is not None:
+                    values[column] = 1.0
+        return X
+
+    def encode_columns(self, columns, out=None):
+        """Encode column arrays (e.g. a DataFrame) with one vectorized pass per category."""
+        n_rows = len(columns[self.numeric_features[0]])
+        X = self._check_out(out, n_rows)
+        for i, feature in enumerate(self.numeric_features):
+            X[:, i] = np.asarray(columns[feature], dtype=np.float64)
+        for feature, lookup in self.lookups:
+            values = np.asarray(columns[feature], dtype=object)
+            known = np.zeros(n_rows, dtype=bool)
+            for category, column in lookup.items():
+                match = values == category
+                known |= match
+                if column is not None:
+                    X[:, column] = match
+            if not known.all():
+                raise self._unknown(feature, values[~known][0])
+        return X
+
+
+# Compare the compiled encoder against the reference pandas/sklearn path on
+# every category combination; outputs must be bit-identical
+def verify_encoder(compiled, reference_fn, numeric_samples=((18, 16.0, 0), (64, 53.13, 5), (39, 30.665, 2))):
+    import itertools
+
+    records = []
+    category_lists = [compiled.categories[f] for f in compiled.categorical_features]
+    for numeric in numeric_samples:
+        for combo in itertools.product(*category_lists):
+            record = dict(zip(compiled.numeric_features, numeric))
+            record.update(zip(compiled.categorical_features, combo))
+            records.append(record)
+
+    expected = reference_fn(records)
+    candidates = [
+        compiled.encode_records(records),
+        np.concatenate([compiled.encode_row(record) for record in records]),
+        compiled.encode_columns({
+            f: [record[f] for record in records]
+            for f in compiled.numeric_features + compiled.categorical_features
+        }),
+    ]
+    return all(
+        candidate.dtype == expected.dtype and candidate.shape == expected.shape
+        and candidate.tobytes() == expected.tobytes()
+        for candidate in candidates
+    )
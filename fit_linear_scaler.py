@@ -0,0 +1,52 @@
+"""Write Linear_Scaler.pkl, the StandardScaler of the linear regression model.
+
+LinearRegression_model.pkl was trained in insurance_parametric_regression.ipynb
+on standardized features. This refits the same scaler deterministically: the
+notebook's encoding (one-hot with the first category dropped) and its 60%
+training split of insurance.csv (train_test_split(test_size=0.4,
+random_state=42)). The output is generated rather than committed, since
+*.pkl files are stored through Git LFS.
+
+    python fit_linear_scaler.py
+    python fit_linear_scaler.py insurance.csv --model-dir models/
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_COLUMNS = ['sex', 'smoker', 'region']
+TARGET_COLUMN = 'charges'
+OUTPUT_FILE = 'Linear_Scaler.pkl'
+
+
+def fit_scaler(frame, test_size=0.4, seed=42):
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    encoder = OneHotEncoder(drop='first', sparse_output=False)
+    encoded = encoder.fit_transform(frame[CATEGORICAL_COLUMNS])
+    X = np.hstack([frame.drop(CATEGORICAL_COLUMNS + [TARGET_COLUMN], axis=1).to_numpy(dtype=np.float64), encoded])
+    X_train, _ = train_test_split(X, test_size=test_size, random_state=seed)
+    return StandardScaler().fit(X_train)
+
+
+def main(argv=None):
+    import joblib
+    parser = argparse.ArgumentParser(description="Refit the linear regression model's StandardScaler")
+    parser.add_argument("data", nargs="?", default="insurance.csv", help="The notebook's training data")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "."),
+                        help="Where Linear_Scaler.pkl is written (default: MODEL_DIR or .)")
+    args = parser.parse_args(argv)
+
+    scaler = fit_scaler(pd.read_csv(args.data))
+    path = os.path.join(args.model_dir, OUTPUT_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(scaler, tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Wrote {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when the inference pool's admission queue is full."""
+
+
+class InferencePool:
+    """Thread pool for CPU-bound inference with a bounded admission queue.
+
+    At most `max_workers` jobs run and `max_queue` more wait; further
+    submissions fail immediately with `PoolSaturated`, so overload turns into
+    fast rejections instead of an ever-growing backlog. Jobs count against
+    the limit until their thread finishes, even if the caller stopped waiting.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+
+    def _release(self, _):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def submit(self, fn, *args):
+        """Schedule `fn(*args)` and return an asyncio future for its result."""
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(f"{self.pending} inference jobs pending")
+            self.pending += 1
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    async def run(self, fn, *args):
+        return await self.submit(fn, *args)
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
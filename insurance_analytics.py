@@ -1,23 +1,537 @@
+import io
+import os
+import threading
+from collections import OrderedDict
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
+from matplotlib.patches import Patch
 from plotly.subplots import make_subplots
+from aggregate_store import DatasetFrame
+from binned_stats import (binned_box_stats, binned_quantiles, grouped_density, grouped_histogram,
+                          histogram_edges, smoothed_density)
 
-def load_data():
-    """Load and enhance the insurance dataset."""
-    df = pd.read_csv('insurance.csv')
-    
-    # Add derived features for better analysis
-    df['age_group'] = pd.cut(df['age'], bins=[0, 25, 35, 50, 100], 
-                            labels=['Young Adult', 'Adult', 'Middle Age', 'Senior'])
-    df['bmi_category'] = pd.cut(df['bmi'], bins=[0, 18.5, 24.9, 29.9, 100], 
-                               labels=['Underweight', 'Normal', 'Overweight', 'Obese'])
-    
-    return df
+# CSV, Parquet (.parquet/.pq) or Feather/Arrow (.feather/.arrow) file, or a
+# directory of such batch files; only the dashboard's columns are read
+DATA_PATH = os.environ.get("INSURANCE_DATA", "insurance.csv")
+PRIMARY_VARS = ['age', 'bmi', 'children', 'charges', 'region', 'smoker', 'sex']
+
+# Rendered charts kept across sessions, and whether to render every
+# variable combination in the background when a dataset version is first seen
+FIGURE_CACHE_SIZE = int(os.environ.get("FIGURE_CACHE_SIZE", "128"))
+PRERENDER_FIGURES = os.environ.get("PRERENDER_FIGURES", "0").lower() in ("1", "true", "yes")
+
+# Datasets with more rows than this are plotted from binned aggregates, so
+# chart cost and payload no longer grow with the row count
+LARGE_DATASET_ROWS = int(os.environ.get("LARGE_DATASET_ROWS", "100000"))
+HISTOGRAM_BINS = 50
+BOX_BINS = 2048
+VIOLIN_BINS = 128
+DENSITY_BINS = 120
+
+def add_derived_columns(df):
+    """Add derived features for better analysis."""
+    return df.assign(
+        age_group=pd.cut(df['age'], bins=[0, 25, 35, 50, 100],
+                         labels=['Young Adult', 'Adult', 'Middle Age', 'Senior']),
+        bmi_category=pd.cut(df['bmi'], bins=[0, 18.5, 24.9, 29.9, 100],
+                            labels=['Underweight', 'Normal', 'Overweight', 'Obese']),
+    )
+
+# cache_resource rather than cache_data: the frame is shared by every session
+# as is, instead of being unpickled into a fresh copy on every rerun. The
+# dashboard only reads it. Refreshing parses only the rows appended since the
+# last rerun (whole files again only if one was rewritten), and the version
+# names exactly the rows in the returned frame, so every chart and
+# prediction cached under it matches its data. The tables shown by the
+# dashboard come from aggregates fed by the same parsed rows, under the same
+# version.
+@st.cache_resource
+def dataset_frame(path):
+    return DatasetFrame(path, prepare=add_derived_columns)
+
+def load_data(path=DATA_PATH):
+    """Return the dataset, its aggregate store and their version."""
+    dataset = dataset_frame(path)
+    with st.spinner("Loading dataset..."):
+        dataset.refresh()
+    return dataset.snapshot()
+
+def is_numeric(df, column):
+    return pd.api.types.is_numeric_dtype(df[column])
+
+def is_large(df):
+    return len(df) > LARGE_DATASET_ROWS
+
+def correlation_matrix(store):
+    return store.correlation()
+
+def summary_statistics(store, df, primary_var):
+    if is_numeric(df, primary_var):
+        return store.describe('region', primary_var)
+    return store.describe(primary_var, 'charges')
+
+def cross_analysis(store, df, primary_var):
+    if is_numeric(df, primary_var):
+        return store.grouped('region', primary_var)
+    return store.crosstab(primary_var)
+
+# Model residuals: the whole dataset is scored in-process with the serving
+# code's preprocessing, one vectorized prediction per model (in chunks of
+# SCORING_CHUNK_ROWS rows to bound the encoded matrix)
+SCORING_CHUNK_ROWS = int(os.environ.get("SCORING_CHUNK_ROWS", "100000"))
+RESIDUAL_GROUPS = ['region', 'smoker', 'age_group']
+
+# Retrained artifacts are picked up by the handler's watcher thread, so reruns
+# never wait on polling the model files
+@st.cache_resource(show_spinner="Loading models...")
+def prediction_service():
+    import prediction_handler
+    prediction_handler.load_models()
+    if prediction_handler.model_watcher:
+        prediction_handler.model_watcher.start()
+    return prediction_handler
+
+def served_models():
+    """The loaded models by name, as currently served."""
+    return dict(prediction_service().SERVED)
+
+def encodable_columns(df, handler):
+    """Feature columns in the serving layout, and which rows the encoder accepts."""
+    columns = {}
+    valid = np.ones(len(df), dtype=bool)
+    for feature in handler.numeric_features:
+        columns[feature] = df[feature].to_numpy(dtype=np.float64)
+        valid &= ~np.isnan(columns[feature])
+    for feature, categories in zip(handler.categorical_features, handler.encoder.categories_):
+        # Lowercase the few categories, not the millions of rows
+        labels = np.append(df[feature].cat.categories.astype(str).str.lower().to_numpy(dtype=object), None)
+        columns[feature] = labels[df[feature].cat.codes.to_numpy()]
+        valid &= np.isin(columns[feature], categories)
+    return columns, valid
+
+# Keyed on the dataset and model versions; `_served` and `_df` are not hashed
+@st.cache_resource(max_entries=16, show_spinner="Scoring dataset...")
+def model_predictions(version, name, model_version, _served, _df):
+    """Predicted charges for every row (NaN where a row cannot be encoded)."""
+    handler = prediction_service()
+    model_type = handler.ModelType(name)
+    columns, valid = encodable_columns(_df, handler)
+    predictions = np.full(len(_df), np.nan)
+    rows = np.flatnonzero(valid)
+    for start in range(0, len(rows), SCORING_CHUNK_ROWS):
+        chunk = rows[start:start + SCORING_CHUNK_ROWS]
+        X = handler.encode_feature_columns({feature: column[chunk] for feature, column in columns.items()})
+        predictions[chunk] = np.expm1(handler.make_prediction(_served.model, X, model_type))
+    return predictions
+
+def residual_metrics(actual, predictions):
+    rows = {}
+    for name, predicted in predictions.items():
+        valid = ~np.isnan(predicted)
+        residual = actual[valid] - predicted[valid]
+        total = actual[valid] - actual[valid].mean()
+        rows[name] = {
+            'rows': int(valid.sum()),
+            'MAE': float(np.abs(residual).mean()),
+            'RMSE': float(np.sqrt((residual ** 2).mean())),
+            'R²': float(1 - (residual ** 2).sum() / (total ** 2).sum()),
+            'mean residual': float(residual.mean()),
+        }
+    summary = pd.DataFrame.from_dict(rows, orient='index')
+    summary.index.name = 'model'
+    return summary
+
+def errors_by_group(df, predictions, group):
+    frames = []
+    actual = df['charges'].to_numpy()
+    for name, predicted in predictions.items():
+        residual = actual - predicted
+        frame = pd.DataFrame({group: df[group], 'residual': residual, 'abs_error': np.abs(residual)})
+        frame = frame.groupby(group, observed=True).agg(
+            MAE=('abs_error', 'mean'), mean_residual=('residual', 'mean')
+        ).reset_index()
+        frame['model'] = name
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def render_residual_density(predicted, residual, name):
+    valid = ~np.isnan(predicted)
+    counts, x_edges, y_edges = grouped_density(
+        predicted[valid], residual[valid], np.zeros(int(valid.sum()), dtype=np.intp), 1, DENSITY_BINS
+    )
+    fig = go.Figure(density_trace(counts[0], x_edges, y_edges, float(np.log10(max(counts.max(), 1)))))
+    fig.add_hline(y=0, line_dash='dash', line_color='white')
+    fig.update_layout(coloraxis={'colorscale': 'Viridis', 'colorbar': {'title': 'log10 rows'}},
+                      xaxis_title='predicted charges', yaxis_title='residual (actual - predicted)',
+                      title=f'Residuals of {name}')
+    return fig
+
+def render_residual_histograms(actual, predictions):
+    residuals = {name: actual - predicted for name, predicted in predictions.items()}
+    pooled = np.concatenate([residual[~np.isnan(residual)] for residual in residuals.values()])
+    # Clip the long tails so the bulk of the distribution stays readable
+    low, high = np.quantile(pooled, [0.005, 0.995])
+    edges = np.linspace(low, high, 101)
+    centers = (edges[:-1] + edges[1:]) / 2
+    fig = go.Figure()
+    for name, residual in residuals.items():
+        counts, _ = np.histogram(residual[~np.isnan(residual)], bins=edges)
+        fig.add_trace(go.Scatter(x=centers, y=counts, mode='lines', line_shape='hvh', name=name))
+    fig.update_layout(xaxis_title='residual (actual - predicted)', yaxis_title='rows',
+                      title='Residual Distribution by Model')
+    return fig
+
+def secondary_options(primary_var):
+    return ['charges' if primary_var != 'charges' else 'age'] + \
+        [var for var in ['age', 'bmi', 'children', 'region', 'smoker', 'sex'] if var != primary_var]
+
+# Chart renderers: (df, primary_var, secondary_var) -> PNG bytes for the
+# seaborn charts, a plotly figure otherwise. Figures are built without
+# pyplot, so none is registered globally (nothing to close, nothing leaks
+# per rerun) and they can be drawn from the pre-render thread.
+
+def new_axes():
+    fig = Figure(figsize=(10, 6))
+    return fig, fig.subplots()
+
+def png_bytes(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
+
+def render_distribution(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        sns.histplot(data=df, x=primary_var, hue='smoker', ax=ax)
+    else:
+        sns.countplot(data=df, x=primary_var, hue='smoker', ax=ax)
+    ax.set_title(f'Distribution of {primary_var} by Smoking Status')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_box(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        sns.boxplot(data=df, y=primary_var, x='region', hue='smoker', ax=ax)
+        ax.set_title(f'{primary_var} Distribution by Region')
+    else:
+        sns.boxplot(data=df, y='charges', x=primary_var, hue='smoker', ax=ax)
+        ax.set_title(f'Charges Distribution by {primary_var}')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_violin(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        sns.violinplot(data=df, y=primary_var, x='region', hue='smoker', split=True, ax=ax)
+        ax.set_title(f'{primary_var} Distribution by Region and Smoking Status')
+    else:
+        sns.violinplot(data=df, y='charges', x=primary_var, hue='smoker', split=True, ax=ax)
+        ax.set_title(f'Charges Distribution by {primary_var} and Smoking Status')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_categorical(df, primary_var, secondary_var):
+    if not is_numeric(df, primary_var):
+        # Create joint plot for categorical variables
+        fig, ax = new_axes()
+        sns.barplot(data=df, x=primary_var, y='charges', hue='smoker', ax=ax)
+        ax.set_title(f'Average Charges by {primary_var} and Smoking Status')
+        ax.tick_params(axis='x', labelrotation=45)
+        return png_bytes(fig)
+    # Alternative visualization for numerical primary variable
+    return px.box(df, x='region', y=primary_var, color='smoker',
+                  title=f'{primary_var} Distribution by Region and Smoking Status')
+
+def render_scatter(df, primary_var, secondary_var):
+    return px.scatter(df, x=primary_var, y=secondary_var,
+                      color='smoker',
+                      title=f'Relationship between {primary_var} and {secondary_var}')
+
+# Binned renderers for large datasets: same charts, drawn from per-group bin
+# counts (one vectorized pass over the rows) instead of the raw rows
+
+def group_codes(df, columns):
+    """Combined integer codes of categorical columns and the label tuple of every code."""
+    codes = np.zeros(len(df), dtype=np.intp)
+    labels = [()]
+    for column in columns:
+        categories = df[column].cat.categories
+        column_codes = df[column].cat.codes.to_numpy().astype(np.intp)
+        codes = np.where((codes < 0) | (column_codes < 0), -1, codes * len(categories) + column_codes)
+        labels = [label + (category,) for label in labels for category in categories]
+    return codes, labels
+
+def grouped_bins(df, column, x_var, hue_var, n_bins):
+    """Histogram of `column` for every (x, hue) pair: (edges, {(x, hue): counts})."""
+    columns = list(dict.fromkeys([x_var, hue_var]))
+    codes, labels = group_codes(df, columns)
+    values = df[column].to_numpy()
+    edges = histogram_edges(values, n_bins)
+    counts = grouped_histogram(values, codes, len(labels), edges)
+    groups = {}
+    for label, row in zip(labels, counts):
+        assignment = dict(zip(columns, label))
+        groups[(assignment[x_var], assignment[hue_var])] = row
+    return edges, groups
+
+def hue_legend(ax, hue_var, hue_values, colors):
+    ax.legend(handles=[Patch(facecolor=color, label=str(value)) for value, color in zip(hue_values, colors)],
+              title=hue_var)
+
+def draw_binned_boxes(ax, df, column, x_var, hue_var):
+    edges, groups = grouped_bins(df, column, x_var, hue_var, BOX_BINS)
+    x_values = list(df[x_var].cat.categories)
+    hue_values = list(df[hue_var].cat.categories)
+    colors = sns.color_palette(n_colors=len(hue_values))
+    width = 0.8 / len(hue_values)
+    for i, x in enumerate(x_values):
+        for j, hue in enumerate(hue_values):
+            stats = binned_box_stats(edges, groups[(x, hue)]) if (x, hue) in groups else None
+            if stats is None:
+                continue
+            ax.bxp([stats], positions=[i - 0.4 + width * (j + 0.5)], widths=width * 0.9,
+                   patch_artist=True, boxprops={'facecolor': colors[j]}, medianprops={'color': 'black'},
+                   showfliers=False)
+    ax.set_xticks(range(len(x_values)), [str(x) for x in x_values])
+    ax.set_xlabel(x_var)
+    ax.set_ylabel(column)
+    hue_legend(ax, hue_var, hue_values, colors)
+
+def draw_binned_violins(ax, df, column, x_var, hue_var):
+    edges, groups = grouped_bins(df, column, x_var, hue_var, VIOLIN_BINS)
+    centers = (edges[:-1] + edges[1:]) / 2
+    x_values = list(df[x_var].cat.categories)
+    hue_values = list(df[hue_var].cat.categories)
+    colors = sns.color_palette(n_colors=len(hue_values))
+    for i, x in enumerate(x_values):
+        for j, hue in enumerate(hue_values):
+            counts = groups.get((x, hue))
+            if counts is None or counts.sum() == 0:
+                continue
+            # Split violins: first hue level on the left, the others on the right
+            side = -1 if j == 0 else 1
+            density = smoothed_density(counts)
+            ax.fill_betweenx(centers, i, i + side * 0.4 * density, color=colors[j], alpha=0.8)
+            median = binned_quantiles(edges, counts, [0.5])[0]
+            ax.plot([i, i + side * 0.15], [median, median], color='black', linewidth=1)
+    ax.set_xticks(range(len(x_values)), [str(x) for x in x_values])
+    ax.set_xlabel(x_var)
+    ax.set_ylabel(column)
+    hue_legend(ax, hue_var, hue_values, colors)
+
+def render_distribution_binned(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        edges, groups = grouped_bins(df, primary_var, 'smoker', 'smoker', HISTOGRAM_BINS)
+        colors = sns.color_palette(n_colors=len(groups))
+        for ((smoker, _), counts), color in zip(groups.items(), colors):
+            ax.stairs(counts, edges, fill=True, alpha=0.5, color=color, label=str(smoker))
+        ax.legend(title='smoker')
+        ax.set_xlabel(primary_var)
+        ax.set_ylabel('Count')
+    else:
+        counts = df.groupby(list(dict.fromkeys([primary_var, 'smoker'])), observed=True).size()
+        sns.barplot(data=counts.reset_index(name='count'), x=primary_var, y='count', hue='smoker', ax=ax)
+    ax.set_title(f'Distribution of {primary_var} by Smoking Status')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_box_binned(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        draw_binned_boxes(ax, df, primary_var, 'region', 'smoker')
+        ax.set_title(f'{primary_var} Distribution by Region')
+    else:
+        draw_binned_boxes(ax, df, 'charges', primary_var, 'smoker')
+        ax.set_title(f'Charges Distribution by {primary_var}')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_violin_binned(df, primary_var, secondary_var):
+    fig, ax = new_axes()
+    if is_numeric(df, primary_var):
+        draw_binned_violins(ax, df, primary_var, 'region', 'smoker')
+        ax.set_title(f'{primary_var} Distribution by Region and Smoking Status')
+    else:
+        draw_binned_violins(ax, df, 'charges', primary_var, 'smoker')
+        ax.set_title(f'Charges Distribution by {primary_var} and Smoking Status')
+    ax.tick_params(axis='x', labelrotation=45)
+    return png_bytes(fig)
+
+def render_categorical_binned(df, primary_var, secondary_var):
+    if not is_numeric(df, primary_var):
+        fig, ax = new_axes()
+        means = df.groupby(list(dict.fromkeys([primary_var, 'smoker'])), observed=True)['charges'].mean()
+        sns.barplot(data=means.reset_index(), x=primary_var, y='charges', hue='smoker', errorbar=None, ax=ax)
+        ax.set_title(f'Average Charges by {primary_var} and Smoking Status')
+        ax.tick_params(axis='x', labelrotation=45)
+        return png_bytes(fig)
+    # Box statistics are computed here and sent instead of the raw rows
+    edges, groups = grouped_bins(df, primary_var, 'region', 'smoker', BOX_BINS)
+    regions = list(df['region'].cat.categories)
+    fig = go.Figure()
+    for smoker in df['smoker'].cat.categories:
+        stats = [binned_box_stats(edges, groups[(region, smoker)]) for region in regions]
+        present = [(region, s) for region, s in zip(regions, stats) if s is not None]
+        fig.add_trace(go.Box(
+            name=str(smoker),
+            x=[region for region, _ in present],
+            q1=[s['q1'] for _, s in present],
+            median=[s['med'] for _, s in present],
+            q3=[s['q3'] for _, s in present],
+            lowerfence=[s['whislo'] for _, s in present],
+            upperfence=[s['whishi'] for _, s in present],
+            mean=[s['mean'] for _, s in present],
+        ))
+    fig.update_layout(boxmode='group', legend_title_text='smoker', xaxis_title='region', yaxis_title=primary_var,
+                      title=f'{primary_var} Distribution by Region and Smoking Status')
+    return fig
+
+def density_trace(grid, x_edges, y_edges, zmax):
+    """Heatmap of log10 row counts per bin (empty bins transparent)."""
+    with np.errstate(divide='ignore'):
+        z = np.round(np.where(grid > 0, np.log10(grid), np.nan), 3).T
+    return go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=z, zmin=0, zmax=zmax, coloraxis='coloraxis'
+    )
+
+def render_scatter_binned(df, primary_var, secondary_var):
+    # One log-scaled density image per smoking status, binned on the server
+    smokers = list(df['smoker'].cat.categories)
+    codes, _ = group_codes(df, ['smoker'])
+    counts, x_edges, y_edges = grouped_density(
+        df[primary_var].to_numpy(), df[secondary_var].to_numpy(), codes, len(smokers), DENSITY_BINS
+    )
+    zmax = float(np.log10(max(counts.max(), 1)))
+    fig = make_subplots(rows=1, cols=len(smokers), shared_yaxes=True,
+                        subplot_titles=[f'smoker = {smoker}' for smoker in smokers])
+    for i, grid in enumerate(counts):
+        fig.add_trace(density_trace(grid, x_edges, y_edges, zmax), row=1, col=i + 1)
+        fig.update_xaxes(title_text=primary_var, row=1, col=i + 1)
+    fig.update_yaxes(title_text=secondary_var, row=1, col=1)
+    fig.update_layout(coloraxis={'colorscale': 'Viridis', 'colorbar': {'title': 'log10 rows'}},
+                      title=f'Relationship between {primary_var} and {secondary_var}')
+    return fig
+
+# chart name -> (renderer, binned renderer for large datasets, whether it
+# depends on the secondary variable)
+CHARTS = {
+    'distribution': (render_distribution, render_distribution_binned, False),
+    'box': (render_box, render_box_binned, False),
+    'violin': (render_violin, render_violin_binned, False),
+    'categorical': (render_categorical, render_categorical_binned, False),
+    'scatter': (render_scatter, render_scatter_binned, True),
+}
+
+def chart_renderer(df, name):
+    renderer, binned_renderer, _ = CHARTS[name]
+    return binned_renderer if is_large(df) else renderer
+
+class FigureCache:
+    """Bounded LRU of rendered charts keyed on (dataset version, chart, primary, secondary).
+
+    Shared by every session. Renders happen outside the lock, so two
+    sessions asking for the same missing chart may both draw it once.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = render()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def has_room(self, version):
+        """Whether another entry fits without evicting a chart of `version`."""
+        with self._lock:
+            return len(self._entries) < self.max_entries or next(iter(self._entries))[0] != version
+
+    def __len__(self):
+        return len(self._entries)
+
+@st.cache_resource
+def figure_cache():
+    return FigureCache(FIGURE_CACHE_SIZE)
+
+def chart_key(version, name, primary_var, secondary_var):
+    return (version, name, primary_var, secondary_var if CHARTS[name][2] else None)
+
+def get_chart(df, version, name, primary_var, secondary_var=None):
+    renderer = chart_renderer(df, name)
+    return figure_cache().get_or_render(
+        chart_key(version, name, primary_var, secondary_var),
+        lambda: renderer(df, primary_var, secondary_var)
+    )
+
+def chart_combinations(df):
+    """Every (chart, primary, secondary) the dashboard can show."""
+    for primary_var in PRIMARY_VARS:
+        for name, (_, _, uses_secondary) in CHARTS.items():
+            if not uses_secondary:
+                yield name, primary_var, None
+                continue
+            for secondary_var in secondary_options(primary_var):
+                if is_numeric(df, primary_var) and is_numeric(df, secondary_var):
+                    yield name, primary_var, secondary_var
+
+# The dataset version prerendered last; a prerender of any older version stops
+# at its next chart
+@st.cache_resource
+def prerender_state():
+    return {'version': None}
+
+# Started once per dataset version; `_df` is excluded from the cache key.
+# Prerendering only fills the figure cache, never evicting charts of the
+# current version that sessions asked for.
+@st.cache_resource(max_entries=4)
+def start_prerender(version, _df):
+    cache = figure_cache()
+    state = prerender_state()
+    state['version'] = version
+
+    def prerender():
+        for name, primary_var, secondary_var in chart_combinations(_df):
+            if state['version'] != version or not cache.has_room(version):
+                return
+            renderer = chart_renderer(_df, name)
+            cache.get_or_render(
+                chart_key(version, name, primary_var, secondary_var),
+                lambda: renderer(_df, primary_var, secondary_var)
+            )
+
+    thread = threading.Thread(target=prerender, name="figure-prerender", daemon=True)
+    thread.start()
+    return thread
+
+def show_chart(chart):
+    if isinstance(chart, bytes):
+        st.image(chart, use_container_width=True)
+    else:
+        st.plotly_chart(chart, use_container_width=True)
 
 def main():
     st.set_page_config(layout="wide")
@@ -38,8 +552,10 @@ def main():
     
     st.title("🏥 Advanced Insurance Data Analysis Dashboard")
     
-    # Load data
-    df = load_data()
+    # Load data (parsed once per file version and shared across sessions)
+    df, store, version = load_data()
+    if PRERENDER_FIGURES:
+        start_prerender(version, df)
     
     # Sidebar for analysis controls
     st.sidebar.header("Analysis Controls")
@@ -47,78 +563,52 @@ def main():
     # Variable selection for analysis
     primary_var = st.sidebar.selectbox(
         "Select Primary Variable",
-        ['age', 'bmi', 'children', 'charges', 'region', 'smoker', 'sex']
+        PRIMARY_VARS
     )
     
     secondary_var = st.sidebar.selectbox(
         "Select Secondary Variable",
-        ['charges' if primary_var != 'charges' else 'age'] + 
-        [var for var in ['age', 'bmi', 'children', 'region', 'smoker', 'sex'] if var != primary_var]
+        secondary_options(primary_var)
     )
     
     # Advanced Analysis Section
     st.header("📊 Advanced Data Analysis")
     
-    tab1, tab2, tab3 = st.tabs(["Distribution Analysis", "Relationship Analysis", "Categorical Insights"])
+    tab1, tab2, tab3, tab4 = st.tabs(
+        ["Distribution Analysis", "Relationship Analysis", "Categorical Insights", "Model Residuals"]
+    )
     
     with tab1:
         col1, col2 = st.columns(2)
         
         with col1:
             # Enhanced distribution plot
-            fig = plt.figure(figsize=(10, 6))
-            if df[primary_var].dtype in ['int64', 'float64']:
-                sns.histplot(data=df, x=primary_var, hue='smoker')
-            else:
-                sns.countplot(data=df, x=primary_var, hue='smoker')
-            plt.title(f'Distribution of {primary_var} by Smoking Status')
-            plt.xticks(rotation=45)
-            st.pyplot(fig)
+            show_chart(get_chart(df, version, 'distribution', primary_var))
         
         with col2:
             # Box plot with individual points
-            fig = plt.figure(figsize=(10, 6))
-            if df[primary_var].dtype in ['int64', 'float64']:
-                sns.boxplot(data=df, y=primary_var, x='region', hue='smoker')
-                plt.title(f'{primary_var} Distribution by Region')
-            else:
-                sns.boxplot(data=df, y='charges', x=primary_var, hue='smoker')
-                plt.title(f'Charges Distribution by {primary_var}')
-            plt.xticks(rotation=45)
-            st.pyplot(fig)
+            show_chart(get_chart(df, version, 'box', primary_var))
     
     with tab2:
         col1, col2 = st.columns(2)
         
         with col1:
             # Scatter plot without trend line
-            if df[primary_var].dtype in ['int64', 'float64'] and df[secondary_var].dtype in ['int64', 'float64']:
-                fig = px.scatter(df, x=primary_var, y=secondary_var, 
-                               color='smoker',
-                               title=f'Relationship between {primary_var} and {secondary_var}')
-                st.plotly_chart(fig, use_container_width=True)
+            if is_numeric(df, primary_var) and is_numeric(df, secondary_var):
+                show_chart(get_chart(df, version, 'scatter', primary_var, secondary_var))
             else:
                 st.write("Cannot create scatter plot for categorical variables")
         
         with col2:
             # Advanced violin plot
-            fig = plt.figure(figsize=(10, 6))
-            if df[primary_var].dtype in ['int64', 'float64']:
-                sns.violinplot(data=df, y=primary_var, x='region', hue='smoker', split=True)
-                plt.title(f'{primary_var} Distribution by Region and Smoking Status')
-            else:
-                sns.violinplot(data=df, y='charges', x=primary_var, hue='smoker', split=True)
-                plt.title(f'Charges Distribution by {primary_var} and Smoking Status')
-            plt.xticks(rotation=45)
-            st.pyplot(fig)
+            show_chart(get_chart(df, version, 'violin', primary_var))
     
     with tab3:
         col1, col2 = st.columns(2)
         
         with col1:
             # Heatmap for numerical variables
-            numerical_cols = df.select_dtypes(include=['int64', 'float64']).columns
-            correlation = df[numerical_cols].corr()
+            correlation = correlation_matrix(store)
             fig = px.imshow(correlation, 
                            title="Correlation Heatmap",
                            labels=dict(color="Correlation"))
@@ -126,43 +616,58 @@ def main():
         
         with col2:
             # Advanced categorical analysis
-            if df[primary_var].dtype not in ['int64', 'float64']:
-                # Create joint plot for categorical variables
-                fig = plt.figure(figsize=(10, 6))
-                sns.barplot(data=df, x=primary_var, y='charges', hue='smoker')
-                plt.title(f'Average Charges by {primary_var} and Smoking Status')
-                plt.xticks(rotation=45)
-                st.pyplot(fig)
-            else:
-                # Alternative visualization for numerical primary variable
-                fig = px.box(df, x='region', y=primary_var, color='smoker',
-                           title=f'{primary_var} Distribution by Region and Smoking Status')
-                st.plotly_chart(fig, use_container_width=True)
+            show_chart(get_chart(df, version, 'categorical', primary_var))
+    
+    with tab4:
+        # Models are loaded and the dataset scored only on request; both are
+        # cached, per dataset version and model version
+        if st.checkbox("Compare the trained models against this dataset"):
+            served = served_models()
+            if not served:
+                st.write("No models could be loaded")
+            # Slow models (e.g. the random forest) can be left out on large extracts
+            names = st.multiselect("Models", list(served), default=list(served)) if served else []
+            predictions = {
+                name: model_predictions(version, name, served[name].version, served[name], df)
+                for name in names
+            }
+            if predictions:
+                actual = df['charges'].to_numpy(dtype=np.float64)
+                st.dataframe(residual_metrics(actual, predictions))
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    group = st.selectbox("Group errors by", RESIDUAL_GROUPS)
+                    errors = errors_by_group(df, predictions, group)
+                    fig = px.bar(errors, x=group, y='MAE', color='model', barmode='group',
+                                 title=f'Mean Absolute Error by {group}')
+                    st.plotly_chart(fig, use_container_width=True)
+                with col2:
+                    name = st.selectbox("Residuals of model", list(predictions))
+                    st.plotly_chart(render_residual_density(predictions[name], actual - predictions[name], name),
+                                    use_container_width=True)
+                st.plotly_chart(render_residual_histograms(actual, predictions), use_container_width=True)
     
     # Detailed Insights Section
     st.header("🔍 Detailed Insights")
     
     # Summary statistics
     if st.checkbox("Show Summary Statistics"):
-        if df[primary_var].dtype in ['int64', 'float64']:
-            summary = df.groupby('region')[primary_var].describe()
+        summary = summary_statistics(store, df, primary_var)
+        if is_numeric(df, primary_var):
             st.write(f"Summary Statistics for {primary_var} by Region:")
-            st.dataframe(summary)
         else:
-            summary = df.groupby(primary_var)['charges'].describe()
             st.write(f"Charges Summary Statistics by {primary_var}:")
-            st.dataframe(summary)
+        st.dataframe(summary)
     
     # Cross-analysis
     if st.checkbox("Show Cross Analysis"):
-        if df[primary_var].dtype not in ['int64', 'float64']:
-            cross_analysis = pd.crosstab(df[primary_var], df['region'], margins=True)
+        analysis = cross_analysis(store, df, primary_var)
+        if not is_numeric(df, primary_var):
             st.write(f"Cross Analysis of {primary_var} by Region:")
-            st.dataframe(cross_analysis)
         else:
-            grouped_analysis = df.groupby('region')[primary_var].agg(['mean', 'median', 'std', 'count'])
             st.write(f"Grouped Analysis of {primary_var} by Region:")
-            st.dataframe(grouped_analysis)
+        st.dataframe(analysis)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""Python client for the insurance prediction API.
+
+Both clients keep one pool of keep-alive connections for their lifetime, so
+repeated calls skip TCP/TLS setup. `predict_many` splits any number of
+records into `/predict/batch` calls of `batch_size` rows and keeps up to
+`concurrency` of them in flight; results come back in input order. `explain`
+splits its records into `/explain` calls the same way. Failed
+connections, timeouts and 429/502/503/504 responses are retried with
+exponential backoff, waiting as long as `Retry-After` asks when the server
+sends it. Every endpoint is a pure function of its input, so retries are
+safe.
+
+    with InsuranceClient("http://localhost:8000") as client:
+        client.predict({"age": 40, "sex": "male", "bmi": 28.5, "children": 2,
+                        "smoker": "no", "region": "southeast"})
+        results = client.predict_many(records, model_type="random_forest")
+
+    async with AsyncInsuranceClient("http://localhost:8000") as client:
+        results = await client.predict_many(records)
+"""
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+DEFAULT_MODEL_TYPE = "xgboost"
+# Rows per /predict/batch call (the server accepts up to 10000)
+DEFAULT_BATCH_SIZE = 1000
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class InsuranceAPIError(Exception):
+    """The API answered with an error status (after any retries)."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _pool_limits(max_connections):
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
+
+def _chunks(records, batch_size):
+    return [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+
+
+def _batch_body(records, model_type):
+    return {"records": [record if "model_type" in record else {**record, "model_type": model_type}
+                        for record in records]}
+
+
+def _offset_results(results, offset):
+    """Batch results carry their index within the chunk; make it the index in the input."""
+    return [{**result, "index": result["index"] + offset} for result in results]
+
+
+class _RetryPolicy:
+    def __init__(self, retries, backoff, max_backoff):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def delay(self, attempt, response=None):
+        """Seconds to wait before retry `attempt` (0-based), or None to give up."""
+        if attempt >= self.retries:
+            return None
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except (TypeError, ValueError):
+                pass
+        # Full jitter, so clients that failed together do not retry together
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def result(response):
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise InsuranceAPIError(response.status_code, detail)
+        return response.json()
+
+
+class InsuranceClient:
+    """Synchronous client; thread-safe, so one instance can serve a whole application."""
+
+    def __init__(self, base_url, timeout=30.0, max_connections=10, retries=3,
+                 backoff=0.1, max_backoff=10.0, batch_size=DEFAULT_BATCH_SIZE, concurrency=4):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._retry = _RetryPolicy(retries, backoff, max_backoff)
+        self._client = httpx.Client(base_url=base_url, timeout=timeout, limits=_pool_limits(max_connections))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._client.close()
+
+    def _request(self, method, path, body=None):
+        attempt = 0
+        while True:
+            try:
+                response = self._client.request(method, path, json=body)
+            except httpx.TransportError:
+                delay = self._retry.delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return self._retry.result(response)
+                delay = self._retry.delay(attempt, response)
+                if delay is None:
+                    return self._retry.result(response)
+            time.sleep(delay)
+            attempt += 1
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def predict(self, record, model_type=DEFAULT_MODEL_TYPE):
+        """Charge for one record: {"model_type", "model_version", "prediction"}."""
+        return self._request("POST", "/predict", {"model_type": model_type, **record})
+
+    def predict_batch(self, records, model_type=DEFAULT_MODEL_TYPE):
+        """One `/predict/batch` call; records without a `model_type` use `model_type`."""
+        return self._request("POST", "/predict/batch", _batch_body(records, model_type))
+
+    def _map_batches(self, path, field, records, model_type):
+        """POST `records` to `path` in `batch_size` chunks; the `field` results in input order."""
+        records = list(records)
+        chunks = _chunks(records, self.batch_size)
+
+        def score(chunk_index):
+            response = self._request("POST", path, _batch_body(chunks[chunk_index], model_type))
+            return _offset_results(response[field], chunk_index * self.batch_size)
+
+        if len(chunks) <= 1 or self.concurrency <= 1:
+            batches = [score(i) for i in range(len(chunks))]
+        else:
+            with ThreadPoolExecutor(min(self.concurrency, len(chunks))) as executor:
+                batches = list(executor.map(score, range(len(chunks))))
+        return [result for batch in batches for result in batch]
+
+    def predict_many(self, records, model_type=DEFAULT_MODEL_TYPE):
+        """Per-record results in input order, each with its input `index` (or an `error`)."""
+        return self._map_batches("/predict/batch", "predictions", records, model_type)
+
+    def explain(self, records, model_type=DEFAULT_MODEL_TYPE):
+        """Per-feature contributions for each record (`/explain`), in input order."""
+        return self._map_batches("/explain", "explanations", records, model_type)
+
+
+class AsyncInsuranceClient:
+    """asyncio client; the same interface as `InsuranceClient`, with coroutines."""
+
+    def __init__(self, base_url, timeout=30.0, max_connections=10, retries=3,
+                 backoff=0.1, max_backoff=10.0, batch_size=DEFAULT_BATCH_SIZE, concurrency=4):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._retry = _RetryPolicy(retries, backoff, max_backoff)
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                         limits=_pool_limits(max_connections))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _request(self, method, path, body=None):
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.request(method, path, json=body)
+            except httpx.TransportError:
+                delay = self._retry.delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return self._retry.result(response)
+                delay = self._retry.delay(attempt, response)
+                if delay is None:
+                    return self._retry.result(response)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def health(self):
+        return await self._request("GET", "/health")
+
+    async def predict(self, record, model_type=DEFAULT_MODEL_TYPE):
+        return await self._request("POST", "/predict", {"model_type": model_type, **record})
+
+    async def predict_batch(self, records, model_type=DEFAULT_MODEL_TYPE):
+        return await self._request("POST", "/predict/batch", _batch_body(records, model_type))
+
+    async def _map_batches(self, path, field, records, model_type):
+        records = list(records)
+        chunks = _chunks(records, self.batch_size)
+        in_flight = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def score(chunk_index):
+            async with in_flight:
+                response = await self._request("POST", path, _batch_body(chunks[chunk_index], model_type))
+            return _offset_results(response[field], chunk_index * self.batch_size)
+
+        batches = await asyncio.gather(*(score(i) for i in range(len(chunks))))
+        return [result for batch in batches for result in batch]
+
+    async def predict_many(self, records, model_type=DEFAULT_MODEL_TYPE):
+        return await self._map_batches("/predict/batch", "predictions", records, model_type)
+
+    async def explain(self, records, model_type=DEFAULT_MODEL_TYPE):
+        return await self._map_batches("/explain", "explanations", records, model_type)
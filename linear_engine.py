@@ -0,0 +1,128 @@
+import threading
+
+import numpy as np
+
+
+class _Workspace(threading.local):
+    """Per-thread scratch buffer reused across calls of the same or smaller batch size."""
+
+    def __init__(self):
+        self.buffer = None
+
+    def get(self, n_rows, n_cols):
+        if self.buffer is None or self.buffer.shape[0] < n_rows or self.buffer.shape[1] != n_cols:
+            self.buffer = np.empty((max(n_rows, 1), n_cols), dtype=np.float64)
+        return self.buffer[:n_rows]
+
+
+def fold_scaler(scaler, model):
+    """Fold a fitted StandardScaler into a linear model's coefficients.
+
+    ((x - mean) / scale) . coef + b  ==  x . (coef / scale) + (b - mean . (coef / scale))
+    """
+    coef = np.asarray(model.coef_, dtype=np.float64).ravel()
+    intercept = float(np.ravel(model.intercept_)[0])
+    if scaler is None:
+        return coef.copy(), intercept
+    mean = np.zeros_like(coef) if scaler.mean_ is None else np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.ones_like(coef) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+    folded = coef / scale
+    return folded, intercept - float(mean @ folded)
+
+
+class FusedLinearModel:
+    """StandardScaler + LinearRegression collapsed into a single dot product."""
+
+    def __init__(self, coef, intercept):
+        self.coef = coef
+        self.intercept = intercept
+
+    @classmethod
+    def from_pipeline(cls, scaler, model):
+        return cls(*fold_scaler(scaler, model))
+
+    def predict(self, X, out=None):
+        X = np.asarray(X, dtype=np.float64)
+        out = np.matmul(X, self.coef, out=out)
+        out += self.intercept
+        return out
+
+    def contributions(self, X, reference):
+        """Exact per-feature terms coef * (x - reference), and the bias f(reference)."""
+        X = np.asarray(X, dtype=np.float64)
+        bias = float(self.coef @ reference) + self.intercept
+        return (X - reference) * self.coef, np.full(X.shape[0], bias)
+
+
+class FusedPolynomialModel:
+    """PolynomialFeatures + StandardScaler + LinearRegression as one quadratic form.
+
+    For degree <= 2 the scaled regression over the expanded features is
+    rewritten as y = b + x . w + x . (Q x), so polynomial features are never
+    materialized; only one (n_rows, n_features) scratch buffer is used, and it
+    is reused per thread across calls.
+    """
+
+    def __init__(self, quadratic, linear, intercept):
+        self.quadratic = quadratic
+        self.linear = linear
+        self.intercept = intercept
+        self._workspace = _Workspace()
+
+    @classmethod
+    def from_pipeline(cls, poly_transformer, scaler, model):
+        powers = np.asarray(poly_transformer.powers_)
+        if powers.sum(axis=1).max() > 2:
+            raise ValueError("Only polynomial transformers up to degree 2 can be fused")
+
+        coef, intercept = fold_scaler(scaler, model)
+        n_features = powers.shape[1]
+        quadratic = np.zeros((n_features, n_features), dtype=np.float64)
+        linear = np.zeros(n_features, dtype=np.float64)
+        for weight, power in zip(coef, powers):
+            terms = np.flatnonzero(power)
+            degree = int(power.sum())
+            if degree == 0:
+                intercept += weight
+            elif degree == 1:
+                linear[terms[0]] += weight
+            elif len(terms) == 1:
+                quadratic[terms[0], terms[0]] += weight
+            else:
+                quadratic[terms[0], terms[1]] += weight
+        return cls(quadratic, linear, intercept)
+
+    def predict(self, X, out=None):
+        X = np.asarray(X, dtype=np.float64)
+        buffer = self._workspace.get(X.shape[0], X.shape[1])
+        np.matmul(X, self.quadratic, out=buffer)
+        buffer += self.linear
+        buffer *= X
+        out = np.sum(buffer, axis=1, out=out)
+        out += self.intercept
+        return out
+
+    def contributions(self, X, reference):
+        """Exact per-feature terms around `reference`, and the bias f(reference).
+
+        With d = x - reference, f(x) = f(reference) + g . d + d . (Q d) where
+        g is the gradient at the reference. Feature j gets g_j d_j, its own
+        squared term and half of every interaction term it takes part in.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        symmetric = self.quadratic + self.quadratic.T
+        gradient = self.linear + reference @ symmetric
+        d = X - reference
+        contributions = d @ symmetric
+        contributions *= 0.5
+        contributions += gradient
+        contributions *= d
+        bias = float(reference @ self.quadratic @ reference + self.linear @ reference) + self.intercept
+        return contributions, np.full(X.shape[0], bias)
+
+
+# True when the fused evaluator reproduces the reference pipeline to within
+# floating point reassociation error
+def verify_fused(fused, reference_fn, X, rtol=1e-9, atol=1e-9):
+    expected = np.asarray(reference_fn(X), dtype=np.float64)
+    return np.allclose(fused.predict(X), expected, rtol=rtol, atol=atol)
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into vectorized calls.
+
+    Each key (a `ModelType`) gets its own asyncio queue and flush task. A flush
+    happens once `max_batch_size` rows are waiting or `max_wait` seconds have
+    passed since the first row of the batch arrived; the coroutine
+    `predict_fn(key, X)` is then awaited once and its outputs are fanned back
+    out to the callers. Rows arriving meanwhile form the next batch.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.002):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._loop = None
+        self._queues = {}
+        self._tasks = {}
+
+    def _queue_for(self, key):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queues and flush tasks are bound to the loop that created them
+            self._loop = loop
+            self._queues = {}
+            self._tasks = {}
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = asyncio.Queue()
+            self._queues[key] = queue
+            self._tasks[key] = loop.create_task(self._run(key, queue))
+        return queue
+
+    async def submit(self, key, X_row):
+        """Queue a (1, n_features) row and wait for its prediction."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue_for(key).put((X_row, future))
+        return await future
+
+    async def _run(self, key, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(key, batch)
+
+    async def _flush(self, key, batch):
+        futures = [future for _, future in batch]
+        try:
+            X = np.concatenate([X_row for X_row, _ in batch], axis=0)
+            predictions = await self.predict_fn(key, X)
+        except Exception as e:
+            logger.error("Micro-batch prediction failed for %s: %s", key, e)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        for future, prediction in zip(futures, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    async def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._queues = {}
+        self._tasks = {}
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from model_store import source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class ServedModel:
+    """One loaded, verified version of a model type.
+
+    Request handlers take a single `ServedModel` reference, so the model and
+    the version they report can never come from two different rollouts.
+    """
+
+    __slots__ = ('name', 'model', 'version', 'digest', 'checksum', 'fingerprint', 'loaded_at')
+
+    def __init__(self, name, model, version, digest, checksum, fingerprint):
+        self.name = name
+        self.model = model
+        self.version = version
+        self.digest = digest
+        self.checksum = checksum
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "checksum": self.checksum,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.loaded_at)),
+        }
+
+
+def artifact_digest(paths):
+    """SHA-256 over the contents of a model's artifacts, in order."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def read_model_manifest(path):
+    """Entries of a model manifest, with file paths resolved against its directory.
+
+        {"xgboost": {"files": ["v7/best_xgboost_model.json"],
+                     "version": "v7", "checksum": "<prediction checksum>"}}
+
+    Missing or unreadable manifests yield no entries (the defaults are served);
+    malformed entries are skipped, so one bad entry does not fail every model.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict):
+            raise ValueError("expected an object of model entries")
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable model manifest %s: %s", path, e)
+        return {}
+    base = os.path.dirname(os.path.abspath(path))
+    entries = {}
+    for name, entry in manifest.items():
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError("expected an object")
+            # Entries without files (e.g. only pinning a checksum) keep the default artifacts
+            files = entry.get('files')
+            if files is not None and (not isinstance(files, list) or not all(isinstance(f, str) for f in files)):
+                raise ValueError("'files' must be a list of paths")
+            entries[name] = {
+                **entry,
+                'files': [os.path.join(base, file) for file in files or []],
+            }
+        except ValueError as e:
+            logger.warning("Ignoring manifest entry %r in %s: %s", name, path, e)
+    return entries
+
+
+class ModelWatcher:
+    """Poll model artifacts and reload a model type when they change.
+
+    A change is only acted on once the new fingerprint (size and mtime of
+    the artifacts and manifest) has been seen on two consecutive polls, so
+    files that are still being copied are not loaded. A version that failed
+    to load is not retried until its artifacts change again. `check()` may
+    be called from any thread; a call made while another poll is running
+    returns at once.
+    """
+
+    def __init__(self, interval, names, fingerprint, current, reload):
+        self.interval = interval
+        self.names = names
+        self.fingerprint = fingerprint
+        self.current = current
+        self.reload = reload
+        self._pending = {}
+        self._rejected = {}
+        self._unreadable = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._check()
+        finally:
+            self._lock.release()
+
+    def _check(self):
+        for name in self.names():
+            try:
+                fingerprint = self.fingerprint(name)
+            except (OSError, ValueError, KeyError) as e:
+                # Once per outage: failed models with missing files are polled too
+                if name not in self._unreadable:
+                    self._unreadable.add(name)
+                    logger.warning("Cannot read artifacts of %s: %s", name, e, extra={"model": name})
+                continue
+            self._unreadable.discard(name)
+            if fingerprint in (self.current(name), self._rejected.get(name)):
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != fingerprint:
+                self._pending[name] = fingerprint
+                continue
+            self._pending.pop(name, None)
+            try:
+                self.reload(name)
+            except Exception as e:
+                self._rejected[name] = fingerprint
+                logger.error("Reloading %s failed; keeping the served version: %s", name, e, extra={"model": name})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Model watcher error: %s", e)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def sources_fingerprint(paths, manifest_path=None):
+    """Fingerprint of a model's artifacts plus the manifest that selected them."""
+    fingerprint = source_fingerprint(paths)
+    if manifest_path and os.path.exists(manifest_path):
+        fingerprint += source_fingerprint([manifest_path])
+    return fingerprint
@@ -0,0 +1,148 @@
+import contextlib
+import json
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: exports are not serialized between processes
+    fcntl = None
+
+import numpy as np
+
+from linear_engine import FusedLinearModel, FusedPolynomialModel
+from tree_engine import FlatTreeEnsemble
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+# Array and scalar constructor arguments of every evaluator that can be shared
+ENGINE_FIELDS = {
+    'FlatTreeEnsemble': (
+        FlatTreeEnsemble,
+        ['feature', 'threshold', 'children', 'value', 'missing_left', 'roots'],
+        ['max_depth', 'average'],
+    ),
+    'FusedLinearModel': (FusedLinearModel, ['coef'], ['intercept']),
+    'FusedPolynomialModel': (FusedPolynomialModel, ['quadratic', 'linear'], ['intercept']),
+}
+
+
+def source_fingerprint(paths):
+    """Identify the artifacts an export was built from (path, size, mtime)."""
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def export_model_arrays(models, sources, directory):
+    """Write the arrays of every shareable evaluator in `models` as .npy files.
+
+    Files are replaced atomically, so processes that already mapped the old
+    version keep reading it. Models without a shareable evaluator (XGBoost,
+    sklearn fallbacks) are skipped. Returns the names that were exported.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    exported = []
+    for name, model in models.items():
+        kind = type(model).__name__
+        if kind not in ENGINE_FIELDS:
+            continue
+        _, array_fields, scalar_fields = ENGINE_FIELDS[kind]
+        model_dir = os.path.join(directory, name)
+        os.makedirs(model_dir, exist_ok=True)
+        for field in array_fields:
+            array = np.ascontiguousarray(getattr(model, field))
+            _write_atomic(os.path.join(model_dir, f"{field}.npy"), lambda f: np.save(f, array))
+        manifest[name] = {
+            'kind': kind,
+            'scalars': {field: getattr(model, field) for field in scalar_fields},
+            'sources': source_fingerprint(sources[name]),
+        }
+        exported.append(name)
+
+    _write_atomic(
+        os.path.join(directory, MANIFEST),
+        lambda f: f.write(json.dumps(manifest, indent=2).encode())
+    )
+    return exported
+
+
+@contextlib.contextmanager
+def export_lock(directory):
+    """Hold an exclusive lock on `directory` across processes while exporting."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_model_arrays(directory, sources):
+    """Memory-map every exported evaluator whose source artifacts are unchanged.
+
+    Arrays are opened read-only with `mmap_mode='r'`, so all processes
+    loading the same directory share one copy through the page cache.
+    """
+    manifest = _read_manifest(directory)
+    models = {}
+    for name, entry in manifest.items():
+        if name not in sources or entry.get('kind') not in ENGINE_FIELDS:
+            continue
+        try:
+            if entry['sources'] != source_fingerprint(sources[name]):
+                logger.info("Shared arrays for %s are stale; ignoring them", name)
+                continue
+            cls, array_fields, _ = ENGINE_FIELDS[entry['kind']]
+            arrays = {
+                field: np.load(os.path.join(directory, name, f"{field}.npy"), mmap_mode='r')
+                for field in array_fields
+            }
+            models[name] = cls(**arrays, **entry['scalars'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.error("Could not map shared arrays for %s: %s", name, e)
+    return models
+
+
+def process_memory():
+    """Resident memory of this process in MB, split into file-backed and anonymous pages."""
+    memory = {"pid": os.getpid()}
+    fields = {"VmRSS": "rss_mb", "VmHWM": "peak_rss_mb", "RssAnon": "rss_anon_mb", "RssFile": "rss_file_mb"}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        # Without /proc only the peak is available (bytes on macOS)
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["peak_rss_mb"] = round(peak / (1024 * 1024), 1)
+        except ImportError:
+            pass
+    return memory
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+# Rough per-entry footprint (key tuple + float + OrderedDict node), used to
+# report the memory held by the cache
+ENTRY_BYTES = 400
+
+
+class PredictionCache:
+    """Bounded LRU cache of predictions keyed on normalized input and model type.
+
+    Concurrent lookups for the same key share a single in-flight computation;
+    if the request running it is cancelled, a waiting request takes over.
+    `invalidate()` drops every entry and bumps the generation, so results of
+    computations started against the previous models are never stored.
+
+    By default the key holds the exact bmi, so a cached quote always equals
+    the uncached one. `bmi_precision` rounds it in the key for a higher hit
+    rate, at the price of serving the quote of a nearby bmi.
+    """
+
+    def __init__(self, max_entries=100000, bmi_precision=None):
+        self.max_entries = max_entries
+        self.bmi_precision = bmi_precision
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, user_input):
+        """Return the input as it is keyed: lowercased categoricals, bmi rounded if `bmi_precision` is set.
+
+        Only the key is normalized; callers score the input they were given.
+        """
+        bmi = float(user_input['bmi'])
+        return {
+            'age': int(user_input['age']),
+            'sex': str(user_input['sex']).lower(),
+            'bmi': bmi if self.bmi_precision is None else round(bmi, self.bmi_precision),
+            'children': int(user_input['children']),
+            'smoker': str(user_input['smoker']).lower(),
+            'region': str(user_input['region']).lower(),
+        }
+
+    def make_key(self, user_input, model_type):
+        normalized = self.normalize(user_input)
+        return (
+            normalized['age'], normalized['sex'], normalized['bmi'], normalized['children'],
+            normalized['smoker'], normalized['region'], str(getattr(model_type, 'value', model_type))
+        )
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return None
+
+    def get(self, key):
+        value = self._lookup(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, awaiting `compute()` at most once per key."""
+        value = self._lookup(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.shared += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+            # The request computing it was cancelled; compute it here instead
+            return await self.get_or_compute(key, compute)
+
+        self.misses += 1
+        generation = self.generation
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled (e.g. the client disconnected) or interrupted: waiters
+            # must not hang on a future nobody will resolve
+            future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            self.put(key, value, generation)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                self._inflight.pop(key)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._inflight = {}
+            self.generation += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.shared
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "approx_bytes": len(self._entries) * ENTRY_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_inflight": self.shared,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.shared) / lookups, 4) if lookups else 0.0,
+            "generation": self.generation,
+        }
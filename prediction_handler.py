@@ -1,22 +1,63 @@
 from fastapi import FastAPI, HTTPException
 import numpy as np
-import pandas as pd
-import xgboost as xgb
-import joblib
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from enum import Enum
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import gc
+import hashlib
+import importlib
 import logging
+import os
+import socket
+import threading
+import time
 import uvicorn
-from fastapi.responses import JSONResponse
+from uvicorn.protocols.http.auto import AutoHTTPProtocol
+from fastapi.responses import JSONResponse, PlainTextResponse
+from feature_encoder import CompiledEncoder, verify_encoder
+from micro_batcher import MicroBatcher
+from inference_pool import InferencePool, PoolSaturated
+from prediction_cache import PredictionCache
+from tree_engine import FlatTreeEnsemble, verify_engine
+from linear_engine import FusedLinearModel, FusedPolynomialModel, verify_fused
+from model_store import export_lock, export_model_arrays, load_model_arrays, process_memory
+from model_registry import ModelWatcher, ServedModel, artifact_digest, read_model_manifest, sources_fingerprint
+from metrics import SIZE_BUCKETS, MetricsMiddleware, MetricsRegistry, request_start
+from structured_logging import RequestLogSampler, configure_logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Logging is set up when the server starts (not on import, so scripts and the
+# dashboard keep their own configuration): records are queued and written as
+# JSON lines (LOG_FORMAT=text for plain lines) by a background thread.
+# Successful requests are logged to prediction_handler.access at
+# LOG_SAMPLE_RATE; 4xx/5xx responses always are (503s from /ready at debug).
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
 logger = logging.getLogger(__name__)
+request_log = RequestLogSampler(logging.getLogger("prediction_handler.access"), LOG_SAMPLE_RATE,
+                                probe_paths=("/ready",))
+
+# Start loading preprocessors and models in the background so the server
+# accepts connections (and answers /health and /ready) immediately
+@asynccontextmanager
+async def lifespan(app):
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    threading.Thread(target=preload_models, name="model-loader", daemon=True).start()
+    if model_watcher:
+        model_watcher.start()
+    yield
+    if model_watcher:
+        model_watcher.stop()
+    if micro_batcher:
+        await micro_batcher.close()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -27,6 +68,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency and traffic metrics, exposed in Prometheus format on /metrics
+METRICS = MetricsRegistry()
+REQUEST_SECONDS = METRICS.histogram(
+    "insurance_request_seconds", "Total request latency by route", ["path"])
+STAGE_SECONDS = METRICS.histogram(
+    "insurance_stage_seconds", "Latency of request stages (parse, validate, preprocess, postprocess)", ["stage"])
+PREDICT_SECONDS = METRICS.histogram(
+    "insurance_predict_seconds", "Model inference latency per call", ["model_type"])
+PREDICT_ROWS = METRICS.histogram(
+    "insurance_predict_rows", "Rows scored per inference call", ["source"], buckets=SIZE_BUCKETS)
+REQUESTS_TOTAL = METRICS.counter(
+    "insurance_requests_total", "Requests served by route and status", ["path", "status"])
+ERRORS_TOTAL = METRICS.counter(
+    "insurance_request_errors_total", "Requests answered with a 4xx/5xx status", ["path", "status"])
+
+# Added last so it wraps CORS too and sees the full request time; it also
+# writes the sampled access log
+app.add_middleware(
+    MetricsMiddleware,
+    request_seconds=REQUEST_SECONDS,
+    requests_total=REQUESTS_TOTAL,
+    errors_total=ERRORS_TOTAL,
+    known_paths=lambda: ROUTE_PATHS,
+    on_request=request_log.log,
+)
+
 # Define model types enum
 class ModelType(str, Enum):
     XGBOOST = "xgboost"
@@ -45,36 +112,183 @@ class InsuranceInput(BaseModel):
     region: str
     model_type: ModelType
 
-# Load models
-def load_models():
-    models = {}
-    try:
-        # Load XGBoost model
-        xgb_model = xgb.Booster()
-        xgb_model.load_model("best_xgboost_model.json")
-        models['xgboost'] = xgb_model
-        
-        # Load other models
-        models['decision_tree'] = joblib.load("DecisionTree_model.pkl")
-        models['random_forest'] = joblib.load("RandomForest_model.pkl")
-        models['linear'] = joblib.load("LinearRegression_model.pkl")
-        
-        # Load Polynomial Regression model and preprocessors
-        poly_model = joblib.load("insurance_Model.pkl")
-        models['polynomial'] = {
-            'model': poly_model,
-            'poly_transformer': joblib.load("Final_Poly_Transformer.pkl"),
-            'scaler': joblib.load("Final_Scaler.pkl")
-        }
-        
-        logger.info("Models loaded successfully!")
-        return models
-    except Exception as e:
-        logger.error(f"Error loading models: {e}")
-        return None
+# Define batch input model (records are validated one by one so a bad row
+# does not reject the whole batch)
+class BatchInsuranceInput(BaseModel):
+    records: List[Any]
+
+# Upper bound on rows accepted by a single /predict/batch call
+MAX_BATCH_SIZE = 10000
+
+# Define all-models input: the features, optional ensemble weights per model
+# type (equal weights when omitted) and an optional per-model time budget
+class EnsembleInput(BaseModel):
+    age: int
+    sex: str
+    bmi: float
+    children: int
+    smoker: str
+    region: str
+    weights: Optional[Dict[ModelType, float]] = None
+    timeout_ms: Optional[float] = None
+
+# Define sweep input: a base input plus one or two swept fields. An axis
+# lists its values, or gives start/stop (inclusive)/step for a numeric field;
+# categorical axes default to every category
+class SweepAxis(BaseModel):
+    field: str
+    values: Optional[List[Any]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    step: Optional[float] = None
+
+class SweepInput(BaseModel):
+    base: InsuranceInput
+    sweep: List[SweepAxis]
+    model_types: Optional[List[ModelType]] = None
+
+# Upper bound on grid points of a /predict/sweep call (per model)
+MAX_SWEEP_POINTS = MAX_BATCH_SIZE
+
+# Default per-model time budget of /predict/all; slower models are skipped
+ENSEMBLE_TIMEOUT_MS = float(os.environ.get("ENSEMBLE_TIMEOUT_MS", "1000"))
+
+# Optional micro-batching: concurrent /predict calls are queued per model type
+# and flushed as one vectorized prediction
+MICRO_BATCHING = os.environ.get("MICRO_BATCHING", "0").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_SIZE = int(os.environ.get("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get("MICRO_BATCH_MAX_WAIT_MS", "2"))
+
+# CPU-bound inference runs on a bounded thread pool so the event loop (and
+# with it /health and /ready) stays responsive. Cores are split between
+# server workers (SERVER_WORKERS, set by the multi-worker launcher), pool
+# threads and XGBoost's own threads so they do not oversubscribe.
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "1"))
+CPU_BUDGET = max(1, (os.cpu_count() or 1) // max(1, SERVER_WORKERS))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", str(CPU_BUDGET)))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", "64"))
+INFERENCE_RETRY_AFTER = os.environ.get("INFERENCE_RETRY_AFTER", "1")
+XGBOOST_THREADS = max(1, CPU_BUDGET // max(1, INFERENCE_WORKERS))
+
+# Prediction cache keyed on normalized input + model type (0 disables it).
+# The key holds the exact bmi unless PREDICTION_CACHE_BMI_PRECISION rounds it;
+# requests are always scored with their own input.
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_BMI_PRECISION = (int(os.environ["PREDICTION_CACHE_BMI_PRECISION"])
+                                  if os.environ.get("PREDICTION_CACHE_BMI_PRECISION") else None)
+# Explanation cache, keyed the same way (0 disables it)
+EXPLANATION_CACHE_SIZE = int(os.environ.get("EXPLANATION_CACHE_SIZE", "10000"))
+# Data whose mean row linear/polynomial explanations are measured from
+EXPLANATION_REFERENCE_DATA = os.environ.get("EXPLANATION_REFERENCE_DATA", "insurance.csv")
+# XGBoost explanations use path contributions like the sklearn trees; exact
+# TreeSHAP is ~100x slower per row
+EXPLANATION_XGBOOST_SHAP = os.environ.get("EXPLANATION_XGBOOST_SHAP", "0").lower() in ("1", "true", "yes")
+
+# Directory of memory-mapped model arrays shared by every worker process
+# (set by the multi-worker launcher below, or by hand)
+MODEL_ARRAY_DIR = os.environ.get("MODEL_ARRAY_DIR")
+
+# Artifacts each served model is built from, relative to MODEL_DIR. A JSON
+# manifest (MODEL_MANIFEST) can point model types at other files and give
+# them a version and a prediction checksum (see `prediction_checksum`).
+# Artifacts and manifest are polled every MODEL_RELOAD_INTERVAL seconds (0
+# disables it) and changed models are swapped in without a restart.
+MODEL_DIR = os.environ.get("MODEL_DIR", ".")
+MODEL_MANIFEST = os.environ.get("MODEL_MANIFEST", os.path.join(MODEL_DIR, "model_manifest.json"))
+MODEL_RELOAD_INTERVAL = float(os.environ.get("MODEL_RELOAD_INTERVAL", "5"))
+MODEL_FILES = {
+    'xgboost': ["best_xgboost_model.json"],
+    'decision_tree': ["DecisionTree_model.pkl"],
+    'random_forest': ["RandomForest_model.pkl"],
+    'linear': ["LinearRegression_model.pkl", "Linear_Scaler.pkl"],
+    'polynomial': ["insurance_Model.pkl", "Final_Poly_Transformer.pkl", "Final_Scaler.pkl"],
+}
+
+# Model types loaded (and warmed up) in the background at startup: "all",
+# "none" or a comma-separated list. The others are loaded on first use.
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "all")
+MODEL_LOAD_WORKERS = int(os.environ.get("MODEL_LOAD_WORKERS", "5"))
+
+# Artifact paths of a model type (in MODEL_FILES order) and its manifest entry
+def model_sources(name):
+    entry = read_model_manifest(MODEL_MANIFEST).get(name, {})
+    paths = entry.get('files') or [os.path.join(MODEL_DIR, file) for file in MODEL_FILES[name]]
+    return paths, entry
+
+# Model loaders; heavy libraries are imported here, not at module import
+def load_xgboost_model(shared, paths):
+    import xgboost as xgb
+    xgb_model = xgb.Booster()
+    xgb_model.load_model(paths[0])
+    xgb_model.set_param({'nthread': XGBOOST_THREADS})
+    return xgb_model
+
+def load_decision_tree_model(shared, paths):
+    import joblib
+    return shared.get('decision_tree') or compile_tree_model(
+        'decision_tree', joblib.load(paths[0])
+    )
+
+def load_random_forest_model(shared, paths):
+    import joblib
+    return shared.get('random_forest') or compile_tree_model(
+        'random_forest', joblib.load(paths[0])
+    )
+
+# Linear Regression uses the scaler fitted on its training split; the scaler
+# is generated by fit_linear_scaler.py rather than committed
+def load_linear_model(shared, paths):
+    import joblib
+    if 'linear' not in shared and not os.path.exists(paths[1]):
+        raise FileNotFoundError(f"{paths[1]} not found; run fit_linear_scaler.py to generate it")
+    return shared.get('linear') or compile_parametric_model('linear', {
+        'model': joblib.load(paths[0]),
+        'scaler': joblib.load(paths[1])
+    })
+
+def load_polynomial_model(shared, paths):
+    import joblib
+    return shared.get('polynomial') or compile_parametric_model('polynomial', {
+        'model': joblib.load(paths[0]),
+        'poly_transformer': joblib.load(paths[1]),
+        'scaler': joblib.load(paths[2])
+    })
+
+# Libraries each loader needs. They are imported one model at a time under
+# `import_lock`: importing scikit-learn from several threads at once can
+# deadlock or expose half-initialized modules
+MODEL_IMPORTS = {
+    'xgboost': ['xgboost'],
+    'decision_tree': ['joblib', 'sklearn.tree'],
+    'random_forest': ['joblib', 'sklearn.ensemble'],
+    'linear': ['joblib', 'sklearn.linear_model', 'sklearn.preprocessing'],
+    'polynomial': ['joblib', 'sklearn.linear_model', 'sklearn.preprocessing'],
+}
+import_lock = threading.Lock()
+
+MODEL_LOADERS = {
+    'xgboost': load_xgboost_model,
+    'decision_tree': load_decision_tree_model,
+    'random_forest': load_random_forest_model,
+    'linear': load_linear_model,
+    'polynomial': load_polynomial_model,
+}
+
+# Load state reported by /ready
+PREPROCESSOR_STATUS = {"status": "not_loaded", "load_seconds": None, "error": None}
+MODEL_STATUS = {
+    name: {"status": "not_loaded", "version": None, "load_seconds": None, "warmup_seconds": None,
+           "error": None, "reload_error": None}
+    for name in MODEL_LOADERS
+}
+preprocessor_lock = threading.Lock()
+model_locks = {name: threading.Lock() for name in MODEL_LOADERS}
 
 # Initialize preprocessors
 def initialize_preprocessors():
+    import pandas as pd
+    from sklearn.preprocessing import OneHotEncoder
+
     categorical_features = ['sex', 'smoker', 'region']
     df = pd.DataFrame([
         {'sex': 'male', 'smoker': 'yes', 'region': 'northeast'},
@@ -89,14 +303,56 @@ def initialize_preprocessors():
 
     return encoder, categorical_features
 
-# Global variables
-MODELS = load_models()
-encoder, categorical_features = initialize_preprocessors()
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_SIZE,
+    bmi_precision=PREDICTION_CACHE_BMI_PRECISION
+) if PREDICTION_CACHE_SIZE > 0 else None
+
+explanation_cache = PredictionCache(
+    max_entries=EXPLANATION_CACHE_SIZE,
+    bmi_precision=PREDICTION_CACHE_BMI_PRECISION
+) if EXPLANATION_CACHE_SIZE > 0 else None
+
+# Drop cached predictions and explanations made with models being replaced
+def invalidate_caches():
+    for cache in (prediction_cache, explanation_cache):
+        if cache:
+            cache.invalidate()
+
+# Replace the served models ({name: ServedModel}, or None to unload them all)
+# and drop every cached prediction made with the old ones
+def set_models(served):
+    global SERVED, MODELS
+    SERVED = dict(served or {})
+    MODELS = {name: entry.model for name, entry in SERVED.items()}
+    invalidate_caches()
+
+# Publish one model version. Both dicts are replaced rather than mutated, so
+# readers never see a half-updated dict and requests already holding the old
+# ServedModel finish on the old version.
+def publish_model(served):
+    global SERVED, MODELS
+    replaced = served.name in SERVED
+    SERVED = {**SERVED, served.name: served}
+    MODELS = {name: entry.model for name, entry in SERVED.items()}
+    MODEL_STATUS[served.name]["version"] = served.version
+    if replaced:
+        invalidate_caches()
+
+# Global variables (filled in by `ensure_preprocessors` and `ensure_model`).
+# SERVED maps model types to their ServedModel; MODELS holds the bare models.
+SERVED = {}
+MODELS = None
+encoder = None
+categorical_features = ['sex', 'smoker', 'region']
+numeric_features = ['age', 'bmi', 'children']
+compiled_encoder = None
 
 # Prediction function
 def make_prediction(model, X_user, model_type):
     try:
-        if model_type == ModelType.POLYNOMIAL_REGRESSION:
+        # Unfused sklearn pipelines (fused evaluators take the generic branch)
+        if model_type == ModelType.POLYNOMIAL_REGRESSION and isinstance(model, dict):
             poly_transformer = model['poly_transformer']
             poly_scaler = model['scaler']
             model = model['model']
@@ -104,14 +360,12 @@ def make_prediction(model, X_user, model_type):
             X_user_scaled = poly_scaler.transform(X_user_poly)
             return model.predict(X_user_scaled)
 
-        elif model_type == ModelType.LINEAR_REGRESSION:
-            # ✅ Fit scaler dynamically on `X_user`
-            scaler_lr = StandardScaler()
-            scaler_lr.fit(X_user)
-            X_user_scaled = scaler_lr.transform(X_user)
-            return model.predict(X_user_scaled)
+        elif model_type == ModelType.LINEAR_REGRESSION and isinstance(model, dict):
+            X_user_scaled = model['scaler'].transform(X_user)
+            return model['model'].predict(X_user_scaled)
 
         elif model_type == ModelType.XGBOOST:
+            import xgboost as xgb
             dtest = xgb.DMatrix(X_user)
             return model.predict(dtest)
 
@@ -119,11 +373,12 @@ def make_prediction(model, X_user, model_type):
             return model.predict(X_user)
     
     except Exception as e:
-        logger.error(f"Error during prediction: {e}")
+        logger.error("Error during prediction: %s", e)
         raise
 
-# Preprocessing function
-def preprocess_input(user_df):
+# Reference preprocessing (pandas + sklearn), kept to verify the compiled encoder
+def preprocess_input_reference(user_df):
+    import pandas as pd
     try:
         encoded_columns = encoder.transform(user_df[categorical_features])
         encoded_df = pd.DataFrame(
@@ -136,9 +391,554 @@ def preprocess_input(user_df):
         ], axis=1)
         return X_user
     except Exception as e:
-        logger.error(f"Error during preprocessing: {e}")
+        logger.error("Error during preprocessing: %s", e)
         raise
 
+# Preprocessing function
+def preprocess_input(user_df):
+    if encoder is None:
+        ensure_preprocessors()
+    if compiled_encoder is None:
+        return preprocess_input_reference(user_df)
+    try:
+        return compiled_encoder.encode_columns(user_df)
+    except Exception as e:
+        logger.error("Error during preprocessing: %s", e)
+        raise
+
+# Encode a list of normalized inputs (see `build_user_input`) without pandas
+def encode_user_inputs(user_inputs, out=None):
+    if encoder is None:
+        ensure_preprocessors()
+    if compiled_encoder is None:
+        import pandas as pd
+        return preprocess_input_reference(pd.DataFrame(user_inputs))
+    try:
+        return compiled_encoder.encode_records(user_inputs, out=out)
+    except Exception as e:
+        logger.error("Error during preprocessing: %s", e)
+        raise
+
+# Fit the encoder, compile it once and make sure it reproduces the reference path
+def ensure_preprocessors():
+    global encoder, categorical_features, compiled_encoder
+    with preprocessor_lock:
+        if PREPROCESSOR_STATUS["status"] == "ready":
+            return
+        PREPROCESSOR_STATUS.update(status="loading", error=None)
+        start = time.perf_counter()
+        try:
+            with import_lock:
+                import pandas as pd
+                importlib.import_module('sklearn.preprocessing')
+            encoder, categorical_features = initialize_preprocessors()
+            compiled = CompiledEncoder(encoder, categorical_features, numeric_features)
+            if verify_encoder(compiled, lambda records: preprocess_input_reference(pd.DataFrame(records))):
+                compiled_encoder = compiled
+            else:
+                logger.error("Compiled encoder does not match the reference encoder; using pandas preprocessing")
+        except Exception as e:
+            PREPROCESSOR_STATUS.update(status="failed", error=str(e))
+            logger.error("Error initializing preprocessors: %s", e)
+            raise
+        PREPROCESSOR_STATUS.update(status="ready", load_seconds=round(time.perf_counter() - start, 4))
+
+# Draw plausible synthetic inputs covering every category, already normalized
+def sample_user_inputs(n, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = dict(zip(categorical_features, encoder.categories_))
+    return [
+        {
+            'age': int(rng.integers(18, 65)),
+            'sex': str(rng.choice(categories['sex'])),
+            'bmi': round(float(rng.uniform(15.0, 55.0)), 2),
+            'children': int(rng.integers(0, 6)),
+            'smoker': str(rng.choice(categories['smoker'])),
+            'region': str(rng.choice(categories['region']))
+        }
+        for _ in range(n)
+    ]
+
+# Flatten a fitted sklearn tree/forest; keep the estimator if the flattened
+# evaluator does not reproduce its predictions bit for bit
+def compile_tree_model(name, estimator):
+    # Forests pickled with n_jobs > 1 sum their trees in threads, which is not
+    # bit-deterministic (verification would fail) and would start joblib
+    # threads inside every inference pool thread
+    if getattr(estimator, 'n_jobs', None) not in (None, 1):
+        estimator.set_params(n_jobs=1)
+    try:
+        engine = FlatTreeEnsemble.from_estimator(estimator)
+        if verify_engine(engine, estimator, encode_user_inputs(sample_user_inputs(512))):
+            logger.info("Compiled %s: %d trees, %d nodes", name, engine.n_trees, engine.n_nodes)
+            return engine
+        logger.error("Flattened %s does not match sklearn; using the sklearn estimator", name)
+    except Exception as e:
+        logger.error("Could not flatten %s: %s", name, e)
+    return estimator
+
+# Fold the scaler (and polynomial expansion) into the regression coefficients;
+# keep the sklearn pipeline if the fused evaluator does not reproduce it
+def compile_parametric_model(name, pipeline):
+    try:
+        if 'poly_transformer' in pipeline:
+            fused = FusedPolynomialModel.from_pipeline(
+                pipeline['poly_transformer'], pipeline['scaler'], pipeline['model']
+            )
+            model_type = ModelType.POLYNOMIAL_REGRESSION
+        else:
+            fused = FusedLinearModel.from_pipeline(pipeline['scaler'], pipeline['model'])
+            model_type = ModelType.LINEAR_REGRESSION
+        X_check = encode_user_inputs(sample_user_inputs(512))
+        if verify_fused(fused, lambda X: make_prediction(pipeline, X, model_type), X_check):
+            logger.info("Compiled %s into a fused evaluator", name)
+            return fused
+        logger.error("Fused %s does not match the sklearn pipeline; using the pipeline", name)
+    except Exception as e:
+        logger.error("Could not fuse %s: %s", name, e)
+    return pipeline
+
+# Run a synthetic single-row and batch prediction so first requests do not
+# pay for lazy initialization inside the model libraries
+def warm_up_model(name, model):
+    model_type = ModelType(name)
+    for n_rows in (1, 64):
+        make_prediction(model, encode_user_inputs(sample_user_inputs(n_rows)), model_type)
+
+# Hash of a model's predictions on a fixed sample. A manifest entry can carry
+# the checksum recorded when the model was trained; a version that does not
+# reproduce it is never served.
+def prediction_checksum(model, model_type):
+    X_check = encode_user_inputs(sample_user_inputs(256, seed=7))
+    predictions = np.asarray(make_prediction(model, X_check, model_type), dtype=np.float64)
+    if predictions.shape != (len(X_check),) or not np.all(np.isfinite(predictions)):
+        raise ValueError("model returns invalid predictions on the verification sample")
+    return hashlib.sha256(np.round(predictions, 4).tobytes()).hexdigest()[:16]
+
+# Model types whose compiled evaluators can be memory-mapped by every worker
+SHAREABLE_MODELS = ['decision_tree', 'random_forest', 'linear', 'polynomial']
+
+# Map the shared arrays of a model type. When they are stale (a rollout
+# changed its artifacts), the first worker to get here exports the new
+# version and all workers map it, so they keep sharing one copy
+def shared_model_arrays(name, paths):
+    with export_lock(MODEL_ARRAY_DIR):
+        shared = load_model_arrays(MODEL_ARRAY_DIR, {name: paths})
+        if name in shared or name not in SHAREABLE_MODELS:
+            return shared
+        model = MODEL_LOADERS[name]({}, paths)
+        if export_model_arrays({name: model}, {name: paths}, MODEL_ARRAY_DIR):
+            shared = load_model_arrays(MODEL_ARRAY_DIR, {name: paths})
+            if name in shared:
+                logger.info("Exported shared arrays for %s to %s", name, MODEL_ARRAY_DIR)
+                return shared
+        # e.g. the sklearn fallback: nothing to share
+        logger.warning("%s could not be shared; this worker keeps a private copy", name)
+        return {name: model}
+
+# Load, verify and warm up the current artifacts of one model type.
+# Returns (ServedModel, load seconds, warm-up seconds)
+def build_model(name):
+    paths, entry = model_sources(name)
+    # Fingerprint first: a file replaced during the load is picked up again
+    fingerprint = sources_fingerprint(paths, MODEL_MANIFEST)
+    digest = artifact_digest(paths)
+
+    start = time.perf_counter()
+    with import_lock:
+        for module in MODEL_IMPORTS[name]:
+            importlib.import_module(module)
+    # Evaluators exported for the worker processes are mapped instead of unpickled
+    shared = shared_model_arrays(name, paths) if MODEL_ARRAY_DIR else {}
+    model = MODEL_LOADERS[name](shared, paths)
+    load_seconds = round(time.perf_counter() - start, 4)
+
+    checksum = prediction_checksum(model, ModelType(name))
+    if entry.get('checksum') and entry['checksum'] != checksum:
+        raise ValueError(f"prediction checksum {checksum} does not match the manifest ({entry['checksum']})")
+
+    start = time.perf_counter()
+    warm_up_model(name, model)
+    warmup_seconds = round(time.perf_counter() - start, 4)
+
+    version = str(entry.get('version') or digest[:12])
+    return ServedModel(name, model, version, digest, checksum, fingerprint), load_seconds, warmup_seconds
+
+# Load, warm up and publish one model type (no-op if it is already loaded)
+def ensure_model(name):
+    with model_locks[name]:
+        if name in SERVED:
+            return SERVED[name]
+        status = MODEL_STATUS[name]
+        status.update(status="loading", error=None)
+        try:
+            ensure_preprocessors()
+            served, load_seconds, warmup_seconds = build_model(name)
+        except Exception as e:
+            status.update(status="failed", error=str(e))
+            logger.error("Error loading model %s: %s", name, e, extra={"model": name})
+            raise
+        status.update(load_seconds=load_seconds, warmup_seconds=warmup_seconds)
+        publish_model(served)
+        status["status"] = "ready"
+        logger.info("Model %s %s ready (load %ss, warm-up %ss)", name, served.version, load_seconds, warmup_seconds,
+                    extra={"model": name, "version": served.version,
+                           "load_seconds": load_seconds, "warmup_seconds": warmup_seconds})
+        return served
+
+# Build the new version of a served model in the background and swap it in;
+# requests keep using the old version until the new one is verified and warm.
+# Models that failed to load are polled too, so fixing their artifacts or
+# manifest brings them up without a restart
+def reload_model(name):
+    # A model whose load failed is retried once its artifacts or manifest change
+    if name not in SERVED:
+        if MODEL_STATUS[name]["status"] == "failed":
+            ensure_model(name)
+        return
+    with model_locks[name]:
+        current = SERVED.get(name)
+        if current is None:
+            return
+        paths, entry = model_sources(name)
+        fingerprint = sources_fingerprint(paths, MODEL_MANIFEST)
+        if artifact_digest(paths) == current.digest and entry.get('version') in (None, current.version):
+            # Same content (files touched or copied again): nothing to swap
+            current.fingerprint = fingerprint
+            return
+
+        status = MODEL_STATUS[name]
+        try:
+            served, load_seconds, warmup_seconds = build_model(name)
+        except Exception as e:
+            status["reload_error"] = str(e)
+            raise
+        status.update(load_seconds=load_seconds, warmup_seconds=warmup_seconds, reload_error=None)
+        publish_model(served)
+        logger.info("Model %s updated from %s to %s", name, current.version, served.version,
+                    extra={"model": name, "version": served.version, "previous_version": current.version})
+
+model_watcher = ModelWatcher(
+    interval=MODEL_RELOAD_INTERVAL,
+    names=lambda: [name for name in MODEL_LOADERS if name in SERVED or MODEL_STATUS[name]["status"] == "failed"],
+    fingerprint=lambda name: sources_fingerprint(model_sources(name)[0], MODEL_MANIFEST),
+    current=lambda name: SERVED[name].fingerprint if name in SERVED else None,
+    reload=reload_model,
+) if MODEL_RELOAD_INTERVAL > 0 else None
+
+# Load models concurrently; returns the ones that loaded
+def load_models(names=None):
+    names = list(MODEL_LOADERS) if names is None else list(names)
+    ensure_preprocessors()
+    with ThreadPoolExecutor(max_workers=max(1, min(MODEL_LOAD_WORKERS, len(names)))) as pool:
+        futures = {name: pool.submit(ensure_model, name) for name in names}
+    models = {name: future.result().model for name, future in futures.items() if future.exception() is None}
+    logger.info("Models loaded: %s", ', '.join(models) or 'none')
+    return models
+
+# Model types listed in PRELOAD_MODELS
+def preload_model_names():
+    if PRELOAD_MODELS.strip().lower() == "all":
+        return list(MODEL_LOADERS)
+    if PRELOAD_MODELS.strip().lower() == "none":
+        return []
+    return [name.strip() for name in PRELOAD_MODELS.split(",") if name.strip() in MODEL_LOADERS]
+
+# Background startup task
+def preload_models():
+    try:
+        load_models(preload_model_names())
+    except Exception as e:
+        logger.error("Error loading models: %s", e)
+
+# Return the ServedModel for a request, loading it on first use; 503 while unavailable
+async def get_model(model_type):
+    name = ModelType(model_type).value
+    served = SERVED.get(name)
+    if served is not None:
+        return served
+    status = MODEL_STATUS[name]["status"]
+    if status == "not_loaded":
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, ensure_model, name)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Model {name} failed to load: {e}")
+    if status == "failed":
+        raise HTTPException(status_code=503, detail=f"Model {name} failed to load: {MODEL_STATUS[name]['error']}")
+    raise HTTPException(status_code=503, detail=f"Model {name} is still loading",
+                        headers={"Retry-After": "1"})
+
+# Validation needs the fitted encoder's categories
+def require_preprocessors():
+    if PREPROCESSOR_STATUS["status"] != "ready":
+        raise HTTPException(status_code=503, detail="Preprocessors are still loading",
+                            headers={"Retry-After": "1"})
+
+# Normalize a validated input into the raw feature row expected by `preprocess_input`
+def build_user_input(input_data):
+    return {
+        'age': input_data.age,
+        'sex': input_data.sex.lower(),
+        'bmi': input_data.bmi,
+        'children': input_data.children,
+        'smoker': input_data.smoker.lower(),
+        'region': input_data.region.lower()
+    }
+
+# Validate a single batch record, returning (input_data, user_input, error)
+def validate_record(record):
+    if not isinstance(record, dict):
+        return None, None, "Record must be a JSON object"
+    try:
+        input_data = InsuranceInput(**record)
+    except ValidationError as e:
+        messages = [
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+            for err in e.errors()
+        ]
+        return None, None, "; ".join(messages)
+
+    user_input = build_user_input(input_data)
+    error = check_categories(user_input)
+    if error:
+        return None, None, error
+    return input_data, user_input, None
+
+# Validate every row up front and group the valid ones by model type, so each
+# model sees a single preprocessing and prediction call. Returns the results
+# list (errors filled in) and {model_type: [(index, user_input), ...]}
+def validate_records(records):
+    start = time.perf_counter()
+    results = [None] * len(records)
+    groups = {}
+    for index, record in enumerate(records):
+        input_data, user_input, error = validate_record(record)
+        if error:
+            results[index] = {"index": index, "error": error}
+            continue
+        groups.setdefault(input_data.model_type, []).append((index, user_input))
+    observe_stage("validate", start)
+    return results, groups
+
+# Error message for the first unknown category in a normalized input, or None
+def check_categories(user_input):
+    for feature, categories in zip(categorical_features, encoder.categories_):
+        if user_input[feature] not in categories:
+            allowed = ", ".join(str(c) for c in categories)
+            return f"{feature}: must be one of {allowed}"
+    return None
+
+# Record the time from the request entering the app (routing, body read and
+# pydantic validation) until the handler starts
+def observe_parse():
+    start = request_start.get()
+    if start is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - start, "parse")
+
+# Charges from log-space model output. Always computed in float64, so a cached
+# log prediction and a fresh float32 one round to the same cents.
+def to_charges(log_predicted_charges):
+    return np.expm1(np.asarray(log_predicted_charges, dtype=np.float64))
+
+# Record one stage that started at `start`; returns the end time so stages can be chained
+def observe_stage(stage, start):
+    end = time.perf_counter()
+    STAGE_SECONDS.observe(end - start, stage)
+    return end
+
+# `make_prediction` with its latency and row count recorded
+def timed_prediction(model, X_user, model_type, source):
+    start = time.perf_counter()
+    log_predicted_charge = make_prediction(model, X_user, model_type)
+    PREDICT_SECONDS.observe(time.perf_counter() - start, model_type.value)
+    PREDICT_ROWS.observe(len(X_user), source)
+    return log_predicted_charge
+
+# Encode a dict of equally long column arrays without building records
+def encode_feature_columns(columns):
+    if encoder is None:
+        ensure_preprocessors()
+    if compiled_encoder is None:
+        import pandas as pd
+        return preprocess_input_reference(pd.DataFrame(columns))
+    return preprocess_input(columns)
+
+# Values of one sweep axis, validated against the feature's type and categories
+def sweep_axis_values(axis):
+    if axis.field in categorical_features:
+        categories = list(encoder.categories_[categorical_features.index(axis.field)])
+        if axis.values is None:
+            return [str(category) for category in categories]
+        values = [str(value).lower() for value in axis.values]
+        unknown = [value for value in values if value not in categories]
+        if unknown:
+            raise ValueError(f"{axis.field}: unknown values {', '.join(unknown)}")
+        return values
+
+    if axis.field not in numeric_features:
+        raise ValueError(f"Cannot sweep {axis.field!r}; choose from {', '.join(numeric_features + categorical_features)}")
+    if axis.values is not None:
+        values = np.asarray(axis.values, dtype=np.float64)
+    elif axis.start is not None and axis.stop is not None:
+        step = 1.0 if axis.step is None else axis.step
+        if step <= 0 or axis.stop < axis.start:
+            raise ValueError(f"{axis.field}: need start <= stop and a positive step")
+        n_points = int(np.floor((axis.stop - axis.start) / step + 1e-9)) + 1
+        if n_points > MAX_SWEEP_POINTS:
+            raise ValueError(f"{axis.field}: {n_points} points (max {MAX_SWEEP_POINTS})")
+        # Rounded so 18 + k * 0.1 comes out as the decimal the caller meant
+        values = np.round(axis.start + step * np.arange(n_points), 6)
+    else:
+        raise ValueError(f"{axis.field}: give either values or start and stop")
+    if not np.all(np.isfinite(values)):
+        raise ValueError(f"{axis.field}: values must be finite")
+    if axis.field != 'bmi':
+        if not np.all(values == np.round(values)):
+            raise ValueError(f"{axis.field}: values must be integers")
+        return [int(value) for value in values]
+    return [float(value) for value in values]
+
+# Feature columns of the full grid (row-major over the axes)
+def sweep_grid(base_input, axes):
+    sizes = [len(values) for _, values in axes]
+    n_points = int(np.prod(sizes))
+    columns = {}
+    for feature in numeric_features:
+        columns[feature] = np.full(n_points, base_input[feature], dtype=np.float64)
+    for feature in categorical_features:
+        columns[feature] = np.full(n_points, base_input[feature], dtype=object)
+    for i, (field, values) in enumerate(axes):
+        repeats = int(np.prod(sizes[i + 1:]))
+        tiles = int(np.prod(sizes[:i]))
+        column = np.tile(np.repeat(np.asarray(values, dtype=columns[field].dtype), repeats), tiles)
+        columns[field] = column
+    return columns
+
+# Encode the grid once and score it with every requested model (one
+# `make_prediction` call each) as a single inference pool job
+def sweep_predict(models, columns):
+    start = time.perf_counter()
+    X_grid = encode_feature_columns(columns)
+    observe_stage("preprocess", start)
+    return {
+        name: timed_prediction(model, X_grid, ModelType(name), "sweep")
+        for name, model in models.items()
+    }
+
+# Encode and score rows as a single inference pool job
+def encode_and_predict(model, user_inputs, model_type, source):
+    start = time.perf_counter()
+    X_user = encode_user_inputs(user_inputs)
+    observe_stage("preprocess", start)
+    return timed_prediction(model, X_user, model_type, source)
+
+# Lazily built (input features, column -> feature aggregation matrix,
+# reference row) used by explanations; the reference row is the mean encoded
+# training row, so linear terms read as deviations from a typical customer
+EXPLANATION_BASIS = None
+explanation_lock = threading.Lock()
+
+def explanation_basis():
+    global EXPLANATION_BASIS
+    with explanation_lock:
+        if EXPLANATION_BASIS is None:
+            if encoder is None:
+                ensure_preprocessors()
+            compiled = compiled_encoder or CompiledEncoder(encoder, categorical_features, numeric_features)
+            column_features = compiled.column_features()
+            features = numeric_features + categorical_features
+            aggregate = np.zeros((len(column_features), len(features)), dtype=np.float64)
+            aggregate[np.arange(len(column_features)), [features.index(f) for f in column_features]] = 1.0
+            try:
+                with import_lock:
+                    import pandas as pd
+                training = pd.read_csv(EXPLANATION_REFERENCE_DATA)
+                columns = {feature: training[feature].to_numpy() for feature in numeric_features}
+                for feature in categorical_features:
+                    columns[feature] = training[feature].str.lower().to_numpy(dtype=object)
+                reference = encode_feature_columns(columns).mean(axis=0)
+            except (OSError, KeyError, ValueError) as e:
+                logger.warning("No explanation reference data (%s); linear terms are relative to zero", e)
+                reference = np.zeros(len(column_features), dtype=np.float64)
+            EXPLANATION_BASIS = (features, aggregate, reference)
+        return EXPLANATION_BASIS
+
+# Per-column contributions (n_rows, n_columns) and bias (n_rows,) in the
+# model's output space (log charges); bias + contributions sum to the prediction
+def explain_prediction(model, X_user, model_type, reference):
+    if model_type == ModelType.XGBOOST:
+        import xgboost as xgb
+        contributions = model.predict(
+            xgb.DMatrix(X_user), pred_contribs=True, approx_contribs=not EXPLANATION_XGBOOST_SHAP
+        ).astype(np.float64)
+        return contributions[:, :-1], contributions[:, -1]
+    # sklearn fallbacks are converted on the fly; unlike predictions,
+    # explanations do not need bit-exact agreement with the pipeline
+    if isinstance(model, dict):
+        if 'poly_transformer' in model:
+            model = FusedPolynomialModel.from_pipeline(model['poly_transformer'], model['scaler'], model['model'])
+        else:
+            model = FusedLinearModel.from_pipeline(model['scaler'], model['model'])
+    elif model_type in (ModelType.DECISION_TREE, ModelType.RANDOM_FOREST) and not isinstance(model, FlatTreeEnsemble):
+        model = FlatTreeEnsemble.from_estimator(model)
+    if isinstance(model, FlatTreeEnsemble):
+        return model.contributions(X_user)
+    return model.contributions(X_user, reference)
+
+# Encode, score and explain rows as a single inference pool job. Returns
+# (charges, base values, contributions per input feature). Charges come from
+# the regular prediction so they match /predict exactly; the explained sum
+# agrees with them up to float32 rounding (XGBoost)
+def encode_and_explain(model, user_inputs, model_type):
+    _, aggregate, reference = explanation_basis()
+    start = time.perf_counter()
+    X_user = encode_user_inputs(user_inputs)
+    observe_stage("preprocess", start)
+    charges = to_charges(timed_prediction(model, X_user, model_type, "explain"))
+    start = time.perf_counter()
+    contributions, bias = explain_prediction(model, X_user, model_type, reference)
+    contributions = contributions @ aggregate
+    observe_stage("explain", start)
+    return charges, bias, contributions
+
+inference_pool = InferencePool(max_workers=INFERENCE_WORKERS, max_queue=INFERENCE_QUEUE_SIZE)
+
+# Response for requests rejected because the inference pool is full
+def overloaded_error(e):
+    return HTTPException(status_code=503, detail=f"Server busy: {e}",
+                         headers={"Retry-After": INFERENCE_RETRY_AFTER})
+
+# Score an encoded matrix with the currently served version of the given
+# type; returns (prediction, version) per row
+async def predict_model_type(model_type, X_user):
+    served = SERVED[model_type.value]
+    predictions = await inference_pool.run(timed_prediction, served.model, X_user, model_type, "micro_batch")
+    return [(prediction, served.version) for prediction in predictions]
+
+micro_batcher = MicroBatcher(
+    predict_model_type,
+    max_batch_size=MICRO_BATCH_MAX_SIZE,
+    max_wait=MICRO_BATCH_MAX_WAIT_MS / 1000.0
+) if MICRO_BATCHING else None
+
+# Score one normalized input, coalescing with concurrent requests when
+# enabled; returns (log charge, model version)
+async def score_user_input(served, user_input):
+    model_type = ModelType(served.name)
+    if micro_batcher:
+        # Encoding one row is cheap; only the batched prediction is offloaded.
+        # The batch runs on whichever version is served when it is flushed.
+        start = time.perf_counter()
+        X_user = encode_user_inputs([user_input])
+        observe_stage("preprocess", start)
+        log_predicted_charge, version = await micro_batcher.submit(model_type, X_user)
+    else:
+        log_predicted_charges = await inference_pool.run(
+            encode_and_predict, served.model, [user_input], model_type, "predict"
+        )
+        log_predicted_charge, version = log_predicted_charges[0], served.version
+    return float(log_predicted_charge), version
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -147,49 +947,495 @@ async def root():
 # Prediction endpoint
 @app.post("/predict")
 async def predict_insurance(input_data: InsuranceInput):
+    observe_parse()
     try:
-        if not MODELS:
-            raise HTTPException(status_code=500, detail="Models not loaded properly")
-
-        user_input = {
-            'age': input_data.age,
-            'sex': input_data.sex.lower(),
-            'bmi': input_data.bmi,
-            'children': input_data.children,
-            'smoker': input_data.smoker.lower(),
-            'region': input_data.region.lower()
-        }
-        user_df = pd.DataFrame([user_input])
-        X_user = preprocess_input(user_df)
-
-        model = MODELS.get(input_data.model_type)
-        if not model:
-            raise HTTPException(status_code=400, detail=f"Invalid model type: {input_data.model_type}")
+        served = await get_model(input_data.model_type)
 
-        log_predicted_charge = make_prediction(model, X_user, input_data.model_type)
-        predicted_charge = np.expm1(log_predicted_charge)
+        # Cached values are (log charge, version), the model output before
+        # postprocessing; the cache is cleared on every swap
+        user_input = build_user_input(input_data)
+        if prediction_cache:
+            key = prediction_cache.make_key(user_input, input_data.model_type)
+            log_predicted_charge, model_version = await prediction_cache.get_or_compute(
+                key, lambda: score_user_input(served, user_input)
+            )
+        else:
+            log_predicted_charge, model_version = await score_user_input(served, user_input)
 
+        start = time.perf_counter()
+        predicted_charge = float(to_charges(log_predicted_charge))
         response_data = {
             "model_type": input_data.model_type,
-            "prediction": round(float(predicted_charge[0]), 2)
+            "model_version": model_version,
+            "prediction": round(predicted_charge, 2)
         }
         
         # Set CORS headers in response
         response = JSONResponse(content=response_data)
         response.headers["Access-Control-Allow-Origin"] = "*"
+        observe_stage("postprocess", start)
+        return response
+
+    except HTTPException as he:
+        raise he
+    except PoolSaturated as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batch prediction endpoint
+@app.post("/predict/batch")
+async def predict_insurance_batch(batch_input: BatchInsuranceInput):
+    observe_parse()
+    try:
+        require_preprocessors()
+
+        records = batch_input.records
+        if len(records) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"
+            )
+
+        results, groups = await inference_pool.run(validate_records, records)
+
+        for model_type, rows in groups.items():
+            try:
+                served = await get_model(model_type)
+            except HTTPException as he:
+                for index, _ in rows:
+                    results[index] = {"index": index, "error": he.detail}
+                continue
+
+            # Serve cached rows directly and only score the misses
+            if prediction_cache:
+                generation = prediction_cache.generation
+                misses = []
+                for index, user_input in rows:
+                    key = prediction_cache.make_key(user_input, model_type)
+                    cached = prediction_cache.get(key)
+                    if cached is None:
+                        misses.append((index, user_input, key))
+                    else:
+                        results[index] = {
+                            "index": index,
+                            "model_type": model_type,
+                            "model_version": cached[1],
+                            "prediction": round(float(to_charges(cached[0])), 2)
+                        }
+            else:
+                misses = [(index, user_input, None) for index, user_input in rows]
+            if not misses:
+                continue
+
+            try:
+                log_predicted_charges = await inference_pool.run(
+                    encode_and_predict, served.model, [user_input for _, user_input, _ in misses],
+                    model_type, "batch"
+                )
+                predicted_charges = to_charges(log_predicted_charges)
+            except PoolSaturated:
+                raise
+            except Exception as e:
+                logger.error("Batch prediction failed for %s: %s", model_type.value, e)
+                for index, _, _ in misses:
+                    results[index] = {"index": index, "error": str(e)}
+                continue
+
+            for (index, _, key), log_predicted_charge, predicted_charge in zip(
+                misses, log_predicted_charges, predicted_charges
+            ):
+                predicted_charge = float(predicted_charge)
+                if prediction_cache:
+                    prediction_cache.put(key, (float(log_predicted_charge), served.version), generation)
+                results[index] = {
+                    "index": index,
+                    "model_type": model_type,
+                    "model_version": served.version,
+                    "prediction": round(predicted_charge, 2)
+                }
+
+        start = time.perf_counter()
+        failed = sum(1 for result in results if "error" in result)
+        response_data = {
+            "predictions": results,
+            "succeeded": len(results) - failed,
+            "failed": failed
+        }
+
+        response = JSONResponse(content=response_data)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        observe_stage("postprocess", start)
+        return response
+
+    except HTTPException as he:
+        raise he
+    except PoolSaturated as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# What-if sweep endpoint: premium curve (one axis) or surface (two axes)
+@app.post("/predict/sweep")
+async def predict_sweep(sweep_input: SweepInput):
+    observe_parse()
+    try:
+        require_preprocessors()
+        if not 1 <= len(sweep_input.sweep) <= 2:
+            raise HTTPException(status_code=422, detail="Sweep one or two fields")
+        fields = [axis.field for axis in sweep_input.sweep]
+        if len(set(fields)) != len(fields):
+            raise HTTPException(status_code=422, detail="Each field can only be swept once")
+
+        base_input = build_user_input(sweep_input.base)
+        error = check_categories(base_input)
+        if error:
+            raise HTTPException(status_code=422, detail=error)
+        try:
+            axes = [(axis.field, sweep_axis_values(axis)) for axis in sweep_input.sweep]
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        shape = [len(values) for _, values in axes]
+        if 0 in shape or int(np.prod(shape)) > MAX_SWEEP_POINTS:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Sweep has {int(np.prod(shape))} points (must be 1 to {MAX_SWEEP_POINTS})"
+            )
+
+        model_types = sweep_input.model_types or [sweep_input.base.model_type]
+        served_models = {}
+        for model_type in dict.fromkeys(model_types):
+            served = await get_model(model_type)
+            served_models[served.name] = served
+
+        columns = sweep_grid(base_input, axes)
+        log_predictions = await inference_pool.run(
+            sweep_predict, {name: served.model for name, served in served_models.items()}, columns
+        )
+
+        start = time.perf_counter()
+        response_data = {
+            "base": base_input,
+            "axes": [{"field": field, "values": values} for field, values in axes],
+            "predictions": {
+                name: np.round(to_charges(log_prediction), 2).reshape(shape).tolist()
+                for name, log_prediction in log_predictions.items()
+            },
+            "model_versions": {name: served.version for name, served in served_models.items()}
+        }
+
+        response = JSONResponse(content=response_data)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        observe_stage("postprocess", start)
+        return response
+
+    except HTTPException as he:
+        raise he
+    except PoolSaturated as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# All-models endpoint: encode once, score with every loaded model concurrently
+# on the inference pool
+@app.post("/predict/all")
+async def predict_all_models(input_data: EnsembleInput):
+    observe_parse()
+    try:
+        require_preprocessors()
+        served_models = SERVED
+        if not served_models:
+            raise HTTPException(status_code=503, detail="No models are loaded yet",
+                                headers={"Retry-After": "1"})
+
+        timeout_ms = ENSEMBLE_TIMEOUT_MS if input_data.timeout_ms is None else input_data.timeout_ms
+        if timeout_ms <= 0:
+            raise HTTPException(status_code=422, detail="timeout_ms must be positive")
+        weights = input_data.weights
+        if weights is not None:
+            weights = {model_type.value: weight for model_type, weight in weights.items()}
+        if weights is not None and any(weight < 0 for weight in weights.values()):
+            raise HTTPException(status_code=422, detail="weights must not be negative")
+
+        user_input = build_user_input(input_data)
+        error = check_categories(user_input)
+        if error:
+            raise HTTPException(status_code=422, detail=error)
+        if prediction_cache:
+            generation = prediction_cache.generation
+
+        start = time.perf_counter()
+        X_user = encode_user_inputs([user_input])
+        observe_stage("preprocess", start)
+
+        predictions = {}
+        versions = {}
+        skipped = {}
+        keys = {}
+        futures = {}
+        for model_type in ModelType:
+            served = served_models.get(model_type.value)
+            if served is None:
+                skipped[model_type.value] = f"not loaded ({MODEL_STATUS[model_type.value]['status']})"
+                continue
+            if prediction_cache:
+                keys[model_type] = prediction_cache.make_key(user_input, model_type)
+                cached = prediction_cache.get(keys[model_type])
+                if cached is not None:
+                    predictions[model_type.value] = float(to_charges(cached[0]))
+                    versions[model_type.value] = cached[1]
+                    continue
+            futures[model_type] = inference_pool.submit(
+                timed_prediction, served.model, X_user, model_type, "ensemble"
+            )
+
+        if futures:
+            done, _ = await asyncio.wait(futures.values(), timeout=timeout_ms / 1000.0)
+            for model_type, future in futures.items():
+                if future not in done:
+                    # The worker thread finishes on its own; its result is dropped
+                    future.cancel()
+                    skipped[model_type.value] = f"timed out after {timeout_ms:g} ms"
+                elif future.exception() is not None:
+                    logger.error("Prediction failed for %s: %s", model_type.value, future.exception())
+                    skipped[model_type.value] = str(future.exception())
+                else:
+                    log_predicted_charge = float(future.result()[0])
+                    version = served_models[model_type.value].version
+                    if prediction_cache:
+                        prediction_cache.put(keys[model_type], (log_predicted_charge, version), generation)
+                    predictions[model_type.value] = float(to_charges(log_predicted_charge))
+                    versions[model_type.value] = version
+
+        start = time.perf_counter()
+        ordered = [model_type.value for model_type in ModelType if model_type.value in predictions]
+        # Weighted mean of the charges, renormalized over the models that answered
+        used = {
+            name: 1.0 if weights is None else weights.get(name, 0.0)
+            for name in ordered
+        }
+        used = {name: weight for name, weight in used.items() if weight > 0}
+        total = sum(used.values())
+        ensemble = None
+        if total > 0:
+            ensemble = {
+                "prediction": round(sum(weight * predictions[name] for name, weight in used.items()) / total, 2),
+                "weights": {name: round(weight / total, 4) for name, weight in used.items()}
+            }
+
+        response_data = {
+            "predictions": {name: round(predictions[name], 2) for name in ordered},
+            "model_versions": {name: versions[name] for name in ordered},
+            "skipped": {
+                model_type.value: skipped[model_type.value]
+                for model_type in ModelType if model_type.value in skipped
+            },
+            "ensemble": ensemble
+        }
+
+        response = JSONResponse(content=response_data)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        observe_stage("postprocess", start)
         return response
 
     except HTTPException as he:
         raise he
+    except PoolSaturated as e:
+        raise overloaded_error(e)
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-# Health check endpoint
+# Explanation endpoint: per-feature contributions for a batch of records
+@app.post("/explain")
+async def explain_insurance_batch(batch_input: BatchInsuranceInput):
+    observe_parse()
+    try:
+        require_preprocessors()
+
+        records = batch_input.records
+        if len(records) > MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"
+            )
+
+        results, groups = await inference_pool.run(validate_records, records)
+        features = numeric_features + categorical_features
+
+        # Cached values are (charge, base value, contributions, version)
+        def explanation_row(index, model_type, value):
+            charge, base_value, contributions, version = value
+            return {
+                "index": index,
+                "model_type": model_type,
+                "model_version": version,
+                "prediction": round(charge, 2),
+                "base_value": round(base_value, 6),
+                "contributions": {
+                    feature: round(contribution, 6) for feature, contribution in zip(features, contributions)
+                }
+            }
+
+        for model_type, rows in groups.items():
+            try:
+                served = await get_model(model_type)
+            except HTTPException as he:
+                for index, _ in rows:
+                    results[index] = {"index": index, "error": he.detail}
+                continue
+
+            if explanation_cache:
+                generation = explanation_cache.generation
+                misses = []
+                for index, user_input in rows:
+                    key = explanation_cache.make_key(user_input, model_type)
+                    cached = explanation_cache.get(key)
+                    if cached is None:
+                        misses.append((index, user_input, key))
+                    else:
+                        results[index] = explanation_row(index, model_type, cached)
+            else:
+                misses = [(index, user_input, None) for index, user_input in rows]
+            if not misses:
+                continue
+
+            try:
+                charges, bias, contributions = await inference_pool.run(
+                    encode_and_explain, served.model, [user_input for _, user_input, _ in misses], model_type
+                )
+            except PoolSaturated:
+                raise
+            except Exception as e:
+                logger.error("Explanation failed for %s: %s", model_type.value, e)
+                for index, _, _ in misses:
+                    results[index] = {"index": index, "error": str(e)}
+                continue
+
+            for (index, _, key), charge, base_value, row in zip(misses, charges, bias, contributions):
+                value = (float(charge), float(base_value), tuple(row.tolist()), served.version)
+                if explanation_cache:
+                    explanation_cache.put(key, value, generation)
+                results[index] = explanation_row(index, model_type, value)
+
+        start = time.perf_counter()
+        failed = sum(1 for result in results if "error" in result)
+        response_data = {
+            "explanations": results,
+            "succeeded": len(results) - failed,
+            "failed": failed
+        }
+
+        response = JSONResponse(content=response_data)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        observe_stage("postprocess", start)
+        return response
+
+    except HTTPException as he:
+        raise he
+    except PoolSaturated as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Readiness endpoint: 200 once the preprocessors and every preloaded model
+# are loaded and warmed up, 503 until then
+@app.get("/ready")
+async def readiness_check():
+    ready = PREPROCESSOR_STATUS["status"] == "ready" and all(
+        MODEL_STATUS[name]["status"] == "ready" for name in preload_model_names()
+    )
+    response_data = {
+        "ready": ready,
+        "preprocessors": PREPROCESSOR_STATUS,
+        "models": MODEL_STATUS
+    }
+    return JSONResponse(content=response_data, status_code=200 if ready else 503)
+
+# Health check endpoint (liveness; see /ready for readiness)
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "models_loaded": list(MODELS.keys()) if MODELS else []}
+    statuses = [PREPROCESSOR_STATUS["status"]] + [status["status"] for status in MODEL_STATUS.values()]
+    return {
+        "status": "degraded" if "failed" in statuses else "healthy",
+        "models_loaded": list(SERVED),
+        "model_versions": {name: served.describe() for name, served in SERVED.items()},
+        "prediction_cache": prediction_cache.stats() if prediction_cache else None,
+        "explanation_cache": explanation_cache.stats() if explanation_cache else None,
+        "inference_pool": inference_pool.stats(),
+        "worker": process_memory()
+    }
+
+# Cache counters, read at scrape time
+def cache_gauges():
+    if not prediction_cache:
+        return []
+    stats = prediction_cache.stats()
+    return [
+        (f"insurance_prediction_cache_{field}", f"Prediction cache {field.replace('_', ' ')}", stats[field])
+        for field in ("entries", "hits", "misses", "shared_inflight", "evictions")
+    ]
+
+METRICS.gauge_collector(cache_gauges)
+METRICS.gauge_collector(lambda: [
+    ("insurance_inference_pending", "Inference jobs running or queued", inference_pool.pending),
+    ("insurance_inference_rejected", "Inference jobs rejected because the queue was full", inference_pool.rejected),
+])
+
+# Prometheus metrics endpoint (per worker process)
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# Routes reported by name in the metrics; anything else is counted as "other"
+ROUTE_PATHS = frozenset(route.path for route in app.routes)
+
+# With --workers uvicorn binds the shared socket without IPPROTO_TCP, so
+# asyncio never enables TCP_NODELAY on accepted connections and every
+# keep-alive response waits ~40ms for the client's delayed ACK
+class NoDelayHTTPProtocol(AutoHTTPProtocol):
+    def connection_made(self, transport):
+        sock = transport.get_extra_info("socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().connection_made(transport)
 
 # Run the FastAPI app with Uvicorn
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=7860)
\ No newline at end of file
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    parser = argparse.ArgumentParser(description="Insurance Premium Prediction API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=7860)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes sharing memory-mapped model arrays")
+    parser.add_argument("--model-array-dir", default=MODEL_ARRAY_DIR or "model_arrays",
+                        help="Where model arrays are exported for the workers")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port, log_config=None, access_log=False)
+    else:
+        # Export the flattened arrays once (skipping exports that are still
+        # fresh); each worker then maps the same files read-only, so the page
+        # cache holds a single copy
+        sources = {name: model_sources(name)[0] for name in SHAREABLE_MODELS}
+        fresh = load_model_arrays(args.model_array_dir, sources)
+        stale = [name for name in SHAREABLE_MODELS if name not in fresh]
+        if stale:
+            models = load_models(stale)
+            exported = export_model_arrays(
+                models, {name: sources[name] for name in models}, args.model_array_dir
+            )
+            logger.info("Exported shared model arrays to %s: %s", args.model_array_dir, ', '.join(exported))
+        del fresh
+        set_models(None)
+        gc.collect()
+
+        os.environ["MODEL_ARRAY_DIR"] = os.path.abspath(args.model_array_dir)
+        os.environ["SERVER_WORKERS"] = str(args.workers)
+        uvicorn.run("prediction_handler:app", host=args.host, port=args.port, workers=args.workers,
+                    http=NoDelayHTTPProtocol, log_config=None, access_log=False)
\ No newline at end of file
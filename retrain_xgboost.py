@@ -0,0 +1,243 @@
+"""Warm-start retraining of the served XGBoost model on newly arrived rows.
+
+Instead of boosting from scratch on the whole history, the current booster
+(the manifest's xgboost entry, or MODEL_DIR/best_xgboost_model.json) is
+loaded and boosted for `--rounds` more rounds on the new rows only, at the
+learning rate the manifest records for it (or `--learning-rate`). With
+`--refresh-rows N`, the leaf values of the existing trees are first
+re-estimated on the most recent N rows (XGBoost's `refresh` updater), so
+old trees follow drift without being regrown.
+
+The candidate is scored on a holdout made of a `--test-size` share of the
+new rows plus, when `--history` is given, the holdout of the split the
+served model was trained with (recorded in the manifest by train_models.py),
+so forgetting older data shows up too. Without a recorded split only new
+rows are used: the served model may have trained on any history row. Only
+if the candidate is no worse than the served
+booster (within `--tolerance`) is it written to MODEL_DIR/<version>/ and
+the manifest updated; otherwise the exit status is 1 and nothing changes.
+
+`--benchmark` also retrains from scratch on history + new rows with the
+same parameters and total rounds, and reports wall time and holdout
+metrics of both.
+
+    python retrain_xgboost.py new_claims.csv --history insurance.csv --rounds 50
+    python retrain_xgboost.py new_claims.csv --history insurance.csv --refresh-rows 50000 --benchmark
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_registry import artifact_digest, read_model_manifest
+from train_models import cached_matrix, holdout_metrics, manifest_files, update_manifest
+
+MODEL_NAME = 'xgboost'
+
+
+def load_matrix(directory):
+    return np.load(os.path.join(directory, 'X.npy'), mmap_mode='r'), np.load(os.path.join(directory, 'y.npy'))
+
+
+def split_rows(n_rows, test_size, seed):
+    """(train, holdout) row indices, both in original order so the tail stays the most recent.
+
+    The holdout is the same as the one `train_models.cached_splits` draws
+    for the same seed and test size.
+    """
+    holdout = np.zeros(n_rows, dtype=bool)
+    holdout[np.random.default_rng(seed).permutation(n_rows)[:int(round(n_rows * test_size))]] = True
+    return np.flatnonzero(~holdout), np.flatnonzero(holdout)
+
+
+def booster_params(booster, entry, args):
+    """Training parameters of the served booster, with command-line overrides.
+
+    A loaded booster's config only holds library defaults, not the values it
+    was trained with, so the learning rate and depth come from the manifest
+    entry's `params` (recorded by train_models.py and by this script).
+    """
+    config = json.loads(booster.save_config())
+    trained = entry.get('params') or {}
+    learning_rate = args.learning_rate or trained.get('learning_rate') or trained.get('eta')
+    if learning_rate is None:
+        raise SystemExit("The manifest does not record the served booster's learning_rate; pass --learning-rate")
+    return {
+        'eta': float(learning_rate),
+        # Neither trainer sets max_depth, so unless recorded it is XGBoost's default
+        'max_depth': int(trained.get('max_depth', 6)),
+        'objective': config['learner']['objective']['name'],
+        'nthread': args.threads,
+        'seed': args.seed,
+        'verbosity': 0,
+    }
+
+
+def warm_start(booster, params, X_new, y_new, rounds, window=None):
+    """Refresh leaf values on `window` (X, y) if given, then boost `rounds` more rounds on the new rows."""
+    import xgboost as xgb
+    booster = booster.copy()
+    if window is not None:
+        booster = xgb.train(
+            {**params, 'process_type': 'update', 'updater': 'refresh', 'refresh_leaf': 1},
+            xgb.DMatrix(window[0], label=window[1]),
+            num_boost_round=booster.num_boosted_rounds(), xgb_model=booster,
+        )
+    if rounds > 0:
+        booster = xgb.train(params, xgb.DMatrix(X_new, label=y_new), num_boost_round=rounds, xgb_model=booster)
+    return booster
+
+
+def evaluate(booster, X_holdout, y_holdout):
+    import xgboost as xgb
+    return holdout_metrics(y_holdout, booster.predict(xgb.DMatrix(X_holdout)))
+
+
+def run(args):
+    import prediction_handler as handler
+    import xgboost as xgb
+    log_level = getattr(logging, args.log_level.upper())
+    logging.getLogger().setLevel(log_level)
+
+    # The parent is read from the same tree the new version is written to
+    manifest_path = args.manifest or os.path.join(args.model_dir, 'model_manifest.json')
+    entry = read_model_manifest(manifest_path).get(MODEL_NAME, {})
+    paths = entry.get('files') or [os.path.join(args.model_dir, file) for file in handler.MODEL_FILES[MODEL_NAME]]
+    current = xgb.Booster()
+    current.load_model(paths[0])
+    parent_version = str(entry.get('version') or artifact_digest(paths)[:12])
+    params = booster_params(current, entry, args)
+
+    X_new, y_new = load_matrix(cached_matrix(args.data, args.cache_dir, handler)[0])
+    new_train, new_holdout = split_rows(len(y_new), args.test_size, args.seed)
+    holdout_X, holdout_y = [X_new[new_holdout]], [y_new[new_holdout]]
+    split = entry.get('split')
+    split_holdout = False
+    if args.history:
+        X_history, y_history = load_matrix(cached_matrix(args.history, args.cache_dir, handler)[0])
+        split_holdout = bool(split) and split.get('rows') == len(y_history)
+        if split_holdout:
+            # The served model's own holdout: neither it nor the candidate trained on these rows
+            history_train, history_holdout = split_rows(len(y_history), split['test_size'], split['seed'])
+            holdout_X.append(X_history[history_holdout])
+            holdout_y.append(y_history[history_holdout])
+        else:
+            # Which history rows the served model trained on is unknown, so
+            # they cannot be used to validate it; all of them count as training rows
+            history_train = np.arange(len(y_history))
+            print("The served model's training split of --history is not recorded in the manifest; "
+                  "validating on new rows only", file=sys.stderr)
+    X_holdout, y_holdout = np.concatenate(holdout_X), np.concatenate(holdout_y)
+
+    window = None
+    if args.refresh_rows:
+        # The most recent rows: the tail of the history followed by the new rows
+        X_window, y_window = [X_new[new_train]], [y_new[new_train]]
+        if args.history and args.refresh_rows > len(new_train):
+            tail = history_train[-(args.refresh_rows - len(new_train)):]
+            X_window.insert(0, X_history[tail])
+            y_window.insert(0, y_history[tail])
+        window = (np.concatenate(X_window)[-args.refresh_rows:], np.concatenate(y_window)[-args.refresh_rows:])
+
+    start = time.perf_counter()
+    candidate = warm_start(current, params, X_new[new_train], y_new[new_train], args.rounds, window)
+    warm_seconds = time.perf_counter() - start
+
+    baseline = evaluate(current, X_holdout, y_holdout)
+    metrics = evaluate(candidate, X_holdout, y_holdout)
+    report = {
+        'parent_version': parent_version,
+        'rows': {'new': len(new_train), 'refresh': len(window[1]) if window else 0, 'holdout': len(y_holdout)},
+        'current': baseline,
+        'warm_start': {'seconds': round(warm_seconds, 3), 'rounds': candidate.num_boosted_rounds(), **metrics},
+    }
+
+    if args.benchmark:
+        if not args.history:
+            raise SystemExit("--benchmark needs --history to retrain from scratch")
+        start = time.perf_counter()
+        dtrain = xgb.DMatrix(np.concatenate([X_history[history_train], X_new[new_train]]),
+                             label=np.concatenate([y_history[history_train], y_new[new_train]]))
+        full = xgb.train(params, dtrain, num_boost_round=candidate.num_boosted_rounds())
+        full_seconds = time.perf_counter() - start
+        report['full_retrain'] = {
+            'seconds': round(full_seconds, 3), 'rounds': full.num_boosted_rounds(),
+            'rows': dtrain.num_row(), **evaluate(full, X_holdout, y_holdout),
+        }
+        report['speedup'] = round(full_seconds / warm_seconds, 2) if warm_seconds else None
+    print(json.dumps(report, indent=2))
+    if args.benchmark_output:
+        with open(args.benchmark_output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if metrics['rmse_log'] > baseline['rmse_log'] * (1 + args.tolerance):
+        print(f"Holdout RMSE (log) {metrics['rmse_log']} is worse than the served "
+              f"{baseline['rmse_log']}; no artifact written", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        return 0
+
+    version = args.version or time.strftime("v%Y%m%d-%H%M%S")
+    output_dir = os.path.join(args.model_dir, version)
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, handler.MODEL_FILES[MODEL_NAME][0])
+    tmp_path = f"{path}.tmp-{os.getpid()}.json"
+    candidate.save_model(tmp_path)
+    os.replace(tmp_path, path)
+
+    model = handler.MODEL_LOADERS[MODEL_NAME]({}, [path])
+    update_manifest(manifest_path, {MODEL_NAME: {
+        'files': manifest_files(manifest_path, [path]),
+        'version': version,
+        'checksum': handler.prediction_checksum(model, handler.ModelType(MODEL_NAME)),
+        'parent_version': parent_version,
+        'mode': 'warm_start',
+        'params': {'rounds': args.rounds, 'refresh_rows': args.refresh_rows,
+                   'learning_rate': params['eta'], 'max_depth': params['max_depth']},
+        'metrics': metrics,
+        'rows': report['rows'],
+        # The history holdout stays unseen unless the refresh window may have covered it
+        **({'split': split} if split and (split_holdout or not (args.history and args.refresh_rows)) else {}),
+        'fit_seconds': round(warm_seconds, 2),
+        'trained_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }})
+    print(f"Wrote {MODEL_NAME} {version} (from {parent_version}) -> {manifest_path}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Continue boosting the served XGBoost model on new rows")
+    parser.add_argument("data", help="Newly arrived rows (CSV/Parquet/Feather file or directory)")
+    parser.add_argument("--history", default=None,
+                        help="Earlier training data; adds to the holdout, the refresh window and --benchmark")
+    parser.add_argument("--rounds", type=int, default=50, help="Boosting rounds added on the new rows")
+    parser.add_argument("--refresh-rows", type=int, default=0,
+                        help="Re-estimate existing leaf values on the most recent N rows first (0: off)")
+    parser.add_argument("--learning-rate", type=float, default=None,
+                        help="Learning rate of the added rounds (default: the served booster's, as recorded "
+                             "in the manifest; required if it is not)")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Holdout fraction of new and history rows")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Relative holdout RMSE increase still accepted (default: 0)")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Also retrain from scratch and compare wall time and accuracy")
+    parser.add_argument("--benchmark-output", default=None, help="Write the report as JSON")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only; write no artifact")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "."),
+                        help="Directory the new version is written to (default: MODEL_DIR or .)")
+    parser.add_argument("--manifest", default=None,
+                        help="Manifest to update (default: MODEL_DIR/model_manifest.json)")
+    parser.add_argument("--version", default=None, help="Version name (default: v<timestamp>)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="XGBoost threads")
+    parser.add_argument("--cache-dir", default=".train_cache", help="Encoded matrix cache (shared with train_models.py)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="warning")
+    sys.exit(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
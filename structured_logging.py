@@ -0,0 +1,132 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+# (uvicorn's ANSI-colored duplicate of the message is dropped as well)
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "color_message"
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message, extra fields, exc."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain lines, with the fields passed through `extra=` appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                text = str(value)
+                if not text or any(c.isspace() or c in '"=' for c in text):
+                    text = json.dumps(text)
+                line += f" {key}={text}"
+        return line
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    Only `%`-style arguments are merged (so mutable arguments are captured
+    as they were) and tracebacks rendered; JSON encoding and I/O happen in
+    the background.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+
+def configure_logging(level="INFO", fmt="json", stream=None):
+    """Route all logging through a queue drained by a background thread.
+
+    Does nothing if the root logger already has handlers (e.g. configured by
+    the embedding application). Returns the listener, or None.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(TextFormatter())
+
+    records = queue.SimpleQueue()
+    root.addHandler(_EnqueueHandler(records))
+    root.setLevel(level)
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    # Flush whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestLogSampler:
+    """Decide which successful requests get an access log line.
+
+    Sampling happens before a LogRecord is created, so unsampled requests
+    cost one random draw. Client and server errors are always logged; 503
+    (overload, not ready yet) as a warning since it is expected backpressure,
+    and at debug level on `probe_paths`, whose 503 is the answer the probe
+    polls for.
+    """
+
+    def __init__(self, logger, rate, probe_paths=()):
+        self.logger = logger
+        self.rate = rate
+        self.probe_paths = frozenset(probe_paths)
+
+    def log(self, method, path, status, seconds):
+        if status == 503 and path in self.probe_paths:
+            level = logging.DEBUG
+        elif status >= 500 and status != 503:
+            level = logging.ERROR
+        elif status >= 400:
+            level = logging.WARNING
+        elif self.rate <= 0 or (self.rate < 1 and random.random() >= self.rate):
+            return
+        else:
+            level = logging.INFO
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, "request", extra={
+                "method": method,
+                "path": path,
+                "status": status,
+                "duration_ms": round(seconds * 1000, 3),
+                "sample_rate": self.rate if level == logging.INFO else 1.0,
+            })
@@ -0,0 +1,9 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# prediction_handler reads its configuration on import: load nothing from
+# disk and do not poll for model files
+os.environ.setdefault("PRELOAD_MODELS", "none")
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
@@ -0,0 +1,85 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import prediction_handler as handler
+from feature_encoder import CompiledEncoder
+
+# Youngest/oldest age and extreme bmi from insurance.csv, no and the most
+# children, and values that do not round-trip through float32
+NUMERIC_EDGES = [
+    (18, 15.96, 0),
+    (64, 53.13, 5),
+    (0, 0.0, 0),
+    (39, 30.665, 2),
+    (33, 34.485, 1),
+    (100, 1e-7, 10),
+]
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    handler.ensure_preprocessors()
+    return CompiledEncoder(handler.encoder, handler.categorical_features, handler.numeric_features)
+
+
+def all_records(compiled):
+    category_lists = [compiled.categories[f] for f in compiled.categorical_features]
+    return [
+        {**dict(zip(compiled.numeric_features, numeric)), **dict(zip(compiled.categorical_features, combo))}
+        for numeric in NUMERIC_EDGES
+        for combo in itertools.product(*category_lists)
+    ]
+
+
+def reference(records):
+    return handler.preprocess_input_reference(pd.DataFrame(records))
+
+
+def assert_identical(actual, expected):
+    assert actual.dtype == expected.dtype
+    assert actual.shape == expected.shape
+    assert actual.tobytes() == expected.tobytes()
+
+
+def test_every_combination_matches_the_reference(compiled):
+    records = all_records(compiled)
+    assert len(records) == len(NUMERIC_EDGES) * 2 * 2 * 4
+    expected = reference(records)
+
+    assert_identical(compiled.encode_records(records), expected)
+    assert_identical(np.concatenate([compiled.encode_row(record) for record in records]), expected)
+    assert_identical(compiled.encode_columns(pd.DataFrame(records)), expected)
+
+
+def test_feature_names_follow_the_reference_layout(compiled):
+    assert compiled.feature_names == handler.numeric_features + list(
+        handler.encoder.get_feature_names_out(handler.categorical_features)
+    )
+    assert compiled.n_features == reference(all_records(compiled)[:1]).shape[1]
+
+
+def test_reused_buffer_is_fully_overwritten(compiled):
+    records = all_records(compiled)
+    out = compiled.allocate(len(records) + 3)
+    out.fill(np.nan)
+    assert_identical(compiled.encode_records(records, out=out), reference(records))
+    out.fill(7.0)
+    assert_identical(compiled.encode_columns(pd.DataFrame(records), out=out), reference(records))
+    row = compiled.allocate(1)
+    row.fill(7.0)
+    assert_identical(compiled.encode_row(records[-1], out=row), reference(records[-1:]))
+
+
+def test_unknown_category_is_rejected_like_the_reference(compiled):
+    record = {**all_records(compiled)[0], "region": "midwest"}
+    with pytest.raises(ValueError):
+        reference([record])
+    with pytest.raises(ValueError, match="midwest"):
+        compiled.encode_records([record])
+    with pytest.raises(ValueError, match="midwest"):
+        compiled.encode_columns(pd.DataFrame([record]))
+    with pytest.raises(ValueError, match="midwest"):
+        compiled.encode_row(record)
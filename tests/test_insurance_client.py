@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.tree import DecisionTreeRegressor
+
+import prediction_handler as handler
+from insurance_client import AsyncInsuranceClient, InsuranceClient
+from model_registry import ServedModel
+
+
+@pytest.fixture(scope="module")
+def records():
+    handler.ensure_preprocessors()
+    rows = handler.sample_user_inputs(250, seed=3)
+    tree = DecisionTreeRegressor(max_depth=4, random_state=0).fit(
+        handler.encode_user_inputs(rows), np.log1p([row["bmi"] * 300 for row in rows])
+    )
+    previous = handler.SERVED
+    handler.publish_model(ServedModel("decision_tree", handler.compile_tree_model("decision_tree", tree),
+                                      "test", "test", None, None))
+    yield rows
+    handler.set_models(previous)
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    # The server rejects anything above 100 records; the clients send 40
+    monkeypatch.setattr(handler, "MAX_BATCH_SIZE", 100)
+    monkeypatch.setattr(handler, "prediction_cache", None)
+
+
+def sync_client(batch_size):
+    client = InsuranceClient("http://testserver", batch_size=batch_size, retries=0)
+    client._client = TestClient(handler.app)
+    return client
+
+
+def async_client(batch_size):
+    client = AsyncInsuranceClient("http://testserver", batch_size=batch_size, retries=0)
+    client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=handler.app), base_url="http://testserver")
+    return client
+
+
+def test_explain_is_split_into_batches(records, small_batches):
+    with sync_client(batch_size=40) as client:
+        explanations = client.explain(records, model_type="decision_tree")
+        predictions = client.predict_many(records, model_type="decision_tree")
+
+    assert [row["index"] for row in explanations] == list(range(len(records)))
+    assert [row["prediction"] for row in explanations] == [row["prediction"] for row in predictions]
+    with sync_client(batch_size=40) as client:
+        assert explanations[45:60] == [
+            {**row, "index": row["index"] + 45} for row in client.explain(records[45:60], "decision_tree")
+        ]
+
+
+def test_async_explain_is_split_into_batches(records, small_batches):
+    async def explain():
+        async with async_client(batch_size=40) as client:
+            return await client.explain(records, model_type="decision_tree")
+
+    with sync_client(batch_size=40) as client:
+        expected = client.explain(records, model_type="decision_tree")
+    assert asyncio.run(explain()) == expected
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sklearn.tree import DecisionTreeRegressor
+
+import prediction_handler as handler
+from model_registry import ServedModel
+from prediction_cache import PredictionCache
+
+BASE = {"age": 52, "sex": "male", "children": 3, "smoker": "yes", "region": "northwest"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    handler.ensure_preprocessors()
+    # The tree splits between 34.48 and 34.485, which a bmi rounded to 2 decimals would cross
+    rows = [{**BASE, "bmi": bmi} for bmi in (30.0, 34.48, 34.485, 40.0)]
+    target = np.array([10.0, 10.0, 11.0, 11.0])
+    tree = DecisionTreeRegressor(random_state=0).fit(handler.encode_user_inputs(rows), target)
+    model = handler.compile_tree_model("decision_tree", tree)
+    previous = handler.SERVED
+    handler.publish_model(ServedModel("decision_tree", model, "test", "test", None, None))
+    yield TestClient(handler.app)
+    handler.set_models(previous)
+
+
+def quote(client, bmi):
+    response = client.post("/predict", json={**BASE, "bmi": bmi, "model_type": "decision_tree"})
+    assert response.status_code == 200
+    return response.json()["prediction"]
+
+
+def test_cached_quote_equals_uncached(client, monkeypatch):
+    monkeypatch.setattr(handler, "prediction_cache", None)
+    uncached = {bmi: quote(client, bmi) for bmi in (34.48, 34.485)}
+    assert uncached[34.48] != uncached[34.485]
+
+    monkeypatch.setattr(handler, "prediction_cache", PredictionCache())
+    for bmi in (34.48, 34.485, 34.48, 34.485):
+        assert quote(client, bmi) == uncached[bmi]
+    assert handler.prediction_cache.hits == 2
+
+
+def test_rounded_key_still_scores_the_raw_input(client, monkeypatch):
+    monkeypatch.setattr(handler, "prediction_cache", None)
+    uncached = quote(client, 34.485)
+    monkeypatch.setattr(handler, "prediction_cache", PredictionCache(bmi_precision=2))
+    assert quote(client, 34.485) == uncached
+
+
+def test_default_key_keeps_the_exact_bmi():
+    cache = PredictionCache()
+    assert cache.make_key({**BASE, "bmi": 34.485}, "xgboost") != cache.make_key({**BASE, "bmi": 34.48}, "xgboost")
+    assert cache.make_key({**BASE, "sex": "MALE", "bmi": 34.485}, "xgboost") == \
+        cache.make_key({**BASE, "bmi": 34.485}, "xgboost")
+
+
+def test_batch_and_ensemble_hits_equal_misses(client, monkeypatch):
+    records = [{**BASE, "bmi": bmi, "model_type": "decision_tree"} for bmi in (30.0, 34.48, 34.485, 39.123)]
+
+    def scores():
+        batch = client.post("/predict/batch", json={"records": records}).json()["predictions"]
+        ensemble = [client.post("/predict/all", json={**record, "timeout_ms": 10000}).json()["predictions"]
+                    for record in records]
+        return [result["prediction"] for result in batch], ensemble
+
+    monkeypatch.setattr(handler, "prediction_cache", None)
+    uncached = scores()
+    monkeypatch.setattr(handler, "prediction_cache", PredictionCache())
+    assert scores() == uncached
+    assert scores() == uncached
+    assert handler.prediction_cache.hits > 0
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+import prediction_handler as handler
+from tree_engine import FlatTreeEnsemble, verification_matrix, verify_engine
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    handler.ensure_preprocessors()
+    X = handler.encode_user_inputs(handler.sample_user_inputs(400, seed=1))
+    rng = np.random.default_rng(1)
+    # Roughly the shape of the log charges the served trees were fitted on
+    y = 7.5 + 0.03 * X[:, 0] + 0.02 * X[:, 1] + 1.5 * X[:, 4] + rng.normal(0, 0.1, len(X))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def X_test():
+    handler.ensure_preprocessors()
+    return handler.encode_user_inputs(handler.sample_user_inputs(1000, seed=2))
+
+
+ESTIMATORS = {
+    "tree": lambda: DecisionTreeRegressor(random_state=0),
+    "shallow_tree": lambda: DecisionTreeRegressor(max_depth=3, random_state=0),
+    "forest": lambda: RandomForestRegressor(n_estimators=25, max_depth=8, random_state=0),
+    "stump_forest": lambda: RandomForestRegressor(n_estimators=5, max_depth=1, random_state=0),
+}
+
+
+@pytest.mark.parametrize("name", ESTIMATORS)
+def test_predictions_are_bit_identical(name, training_data, X_test):
+    estimator = ESTIMATORS[name]().fit(*training_data)
+    engine = FlatTreeEnsemble.from_estimator(estimator)
+
+    # Rows sitting exactly on every kind of split threshold, plus the training rows
+    for X in (X_test, training_data[0], verification_matrix(engine, X_test, n_threshold_rows=4096)):
+        expected = np.asarray(estimator.predict(X), dtype=np.float64)
+        actual = engine.predict(X)
+        assert actual.shape == expected.shape
+        assert actual.tobytes() == expected.tobytes()
+    assert verify_engine(engine, estimator, X_test)
+
+
+def test_forest_leaves_match_sklearn_apply(training_data, X_test):
+    forest = ESTIMATORS["forest"]().fit(*training_data)
+    engine = FlatTreeEnsemble.from_estimator(forest)
+    leaves = engine.apply(X_test) - engine.roots[:, None]
+    assert np.array_equal(leaves, forest.apply(X_test).T)
+
+
+def test_contributions_add_up_to_the_prediction(training_data, X_test):
+    for name in ("tree", "forest"):
+        engine = FlatTreeEnsemble.from_estimator(ESTIMATORS[name]().fit(*training_data))
+        contributions, bias = engine.contributions(X_test)
+        np.testing.assert_allclose(bias + contributions.sum(axis=1), engine.predict(X_test), rtol=1e-9)
+
+
+def test_verification_catches_a_wrong_evaluator(training_data, X_test):
+    tree = ESTIMATORS["tree"]().fit(*training_data)
+    engine = FlatTreeEnsemble.from_estimator(tree)
+    engine.value = engine.value.copy()
+    engine.value[engine.apply(X_test[:1])[0, 0]] += 1e-12
+    assert not verify_engine(engine, tree, X_test)
+
+
+def test_multi_output_trees_are_rejected(training_data):
+    X, y = training_data
+    tree = DecisionTreeRegressor(max_depth=2).fit(X, np.column_stack([y, y]))
+    with pytest.raises(ValueError):
+        FlatTreeEnsemble.from_estimator(tree)
@@ -0,0 +1,405 @@
+"""Train the five served model families and write versioned artifacts.
+
+Replaces the hand-run notebooks. The dataset (CSV, Parquet/Feather, or a
+directory of them) is read once and encoded with the serving encoder. The
+encoded matrix is cached on disk, keyed by the data files' size and mtime
+and the encoder's columns, so later runs on the same data skip parsing.
+Holdout and CV fold indices are cached next to it.
+
+The hyperparameter searches of all families run as one pool of trials
+spread over every core; each worker maps the cached matrix and gathers
+each CV fold only once. The best parameters of each family are refit on
+the whole training split and scored on the holdout split. The artifacts go
+to MODEL_DIR/<version>/, and the entries of `model_manifest.json` (files,
+version, prediction checksum, metrics, timings) are updated, so a running
+API picks the new version up on its next poll.
+
+    python train_models.py insurance.csv --trials 40 --workers 8
+    python train_models.py claims/ --models xgboost,random_forest --version v12
+"""
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from aggregate_store import dataset_files, is_columnar, read_columnar
+
+FEATURE_COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region']
+TARGET_COLUMN = 'charges'
+
+# Search spaces of the notebooks' Optuna studies: (kind, low, high), inclusive.
+# Linear and polynomial (degree 2, the degree the fused evaluator serves)
+# have no hyperparameters and are fit once.
+SEARCH_SPACES = {
+    'xgboost': {'n_estimators': ('int', 100, 1000), 'learning_rate': ('float', 0.001, 0.1)},
+    'decision_tree': {'max_depth': ('int', 2, 50), 'min_samples_split': ('int', 2, 50)},
+    'random_forest': {
+        'n_estimators': ('int', 50, 200), 'max_depth': ('int', 5, 20), 'min_samples_split': ('int', 2, 20),
+    },
+    'linear': {},
+    'polynomial': {},
+}
+# Slowest families first, so the pool does not end on a long tail of forests
+SCHEDULE_ORDER = ['random_forest', 'xgboost', 'decision_tree', 'polynomial', 'linear']
+
+# Set in each worker process by `init_worker`
+X = None
+y = None
+splits = None
+
+
+# Reading and encoding
+
+def data_fingerprint(path):
+    files = dataset_files(path)
+    if not files:
+        raise SystemExit(f"No data files found in {path}")
+    return [[os.path.abspath(file), os.stat(file).st_size, os.stat(file).st_mtime_ns] for file in files]
+
+
+def read_dataset(path):
+    columns = FEATURE_COLUMNS + [TARGET_COLUMN]
+    frames = [
+        read_columnar(file, columns) if is_columnar(file) else pd.read_csv(file, usecols=columns)
+        for file in dataset_files(path)
+    ]
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def encode_dataset(frame, handler):
+    """Encode the valid rows with the serving encoder; returns (X, log1p(charges), n_invalid)."""
+    handler.ensure_preprocessors()
+    features = frame[FEATURE_COLUMNS].copy()
+    for column in handler.categorical_features:
+        features[column] = features[column].astype(str).str.strip().str.lower()
+    # Unparseable numbers invalidate their row instead of failing the run
+    for column in handler.numeric_features:
+        features[column] = pd.to_numeric(features[column], errors='coerce')
+    charges = pd.to_numeric(frame[TARGET_COLUMN], errors='coerce').to_numpy(dtype=np.float64)
+    valid = features[handler.numeric_features].notna().all(axis=1).to_numpy().copy()
+    valid &= np.isfinite(charges) & (charges >= 0)
+    for column, categories in zip(handler.categorical_features, handler.encoder.categories_):
+        valid &= features[column].isin(categories).to_numpy()
+    encoded = np.ascontiguousarray(handler.encode_feature_columns(features[valid]), dtype=np.float64)
+    target = np.log1p(charges[valid])
+    return encoded, target, int((~valid).sum())
+
+
+def cached_matrix(path, cache_dir, handler):
+    """Paths of the encoded matrix and target, encoding the dataset on a cache miss."""
+    handler.ensure_preprocessors()
+    key = hashlib.sha256(json.dumps({
+        'data': data_fingerprint(path),
+        'columns': handler.compiled_encoder.feature_names if handler.compiled_encoder else None,
+    }).encode()).hexdigest()[:16]
+    directory = os.path.join(cache_dir, key)
+    X_path, y_path = os.path.join(directory, 'X.npy'), os.path.join(directory, 'y.npy')
+    if os.path.exists(X_path) and os.path.exists(y_path):
+        logging.getLogger(__name__).info("Using cached feature matrix %s", directory)
+        return directory, 0
+    os.makedirs(directory, exist_ok=True)
+    encoded, target, invalid = encode_dataset(read_dataset(path), handler)
+    # Written under temporary names, so an interrupted run never leaves a partial cache
+    for final, array in ((y_path, target), (X_path, encoded)):
+        tmp_path = f"{final}.tmp-{os.getpid()}.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, final)
+    return directory, invalid
+
+
+def cached_splits(directory, n_rows, test_size, n_folds, search_rows, seed):
+    """Path of the holdout and CV fold indices, computed once per (data, split settings)."""
+    path = os.path.join(directory, f"splits-{test_size}-{n_folds}-{search_rows}-{seed}.npz")
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n_rows)
+    n_test = int(round(n_rows * test_size))
+    test, train = np.sort(order[:n_test]), np.sort(order[n_test:])
+    # The search runs on (at most `search_rows` of) the training split
+    search = np.sort(rng.permutation(train)[:search_rows])
+    fold_of = rng.permutation(len(search)) % n_folds
+    result = {'train': train, 'test': test}
+    for k in range(n_folds):
+        result[f'fold{k}_train'] = search[fold_of != k]
+        result[f'fold{k}_valid'] = search[fold_of == k]
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    np.savez(tmp_path, **result)
+    os.replace(tmp_path, path)
+    return path
+
+
+def sample_candidates(name, n_trials, seed):
+    """Random search over the family's space; reproducible for a given seed."""
+    space = SEARCH_SPACES[name]
+    if not space:
+        return [{}]
+    rng = np.random.default_rng([seed, SCHEDULE_ORDER.index(name)])
+    candidates = []
+    for _ in range(n_trials):
+        params = {}
+        for param, (kind, low, high) in space.items():
+            if kind == 'int':
+                params[param] = int(rng.integers(low, high + 1))
+            else:
+                params[param] = round(float(rng.uniform(low, high)), 6)
+        candidates.append(params)
+    return candidates
+
+
+# Fitting (in worker processes)
+
+def fit_model(name, params, X_train, y_train, seed, threads=1):
+    """Fitted artifacts of one family, in the order of the handler's MODEL_FILES."""
+    if name == 'xgboost':
+        import xgboost as xgb
+        dtrain = X_train if isinstance(X_train, xgb.DMatrix) else xgb.DMatrix(X_train, label=y_train)
+        booster = xgb.train(
+            {'eta': params['learning_rate'], 'nthread': threads, 'seed': seed, 'verbosity': 0},
+            dtrain, num_boost_round=params['n_estimators'],
+        )
+        return [booster]
+    if name == 'decision_tree':
+        from sklearn.tree import DecisionTreeRegressor
+        return [DecisionTreeRegressor(**params, random_state=seed).fit(X_train, y_train)]
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestRegressor
+        forest = RandomForestRegressor(**params, random_state=seed, n_jobs=threads).fit(X_train, y_train)
+        # Threaded tree accumulation is not bit-deterministic; the served
+        # estimator must predict single-threaded for the flat engine to verify
+        return [forest.set_params(n_jobs=1)]
+
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+    if name == 'linear':
+        scaler = StandardScaler().fit(X_train)
+        return [LinearRegression().fit(scaler.transform(X_train), y_train), scaler]
+    poly = PolynomialFeatures(degree=2, include_bias=False)
+    X_poly = poly.fit_transform(X_train)
+    scaler = StandardScaler().fit(X_poly)
+    return [LinearRegression().fit(scaler.transform(X_poly), y_train), poly, scaler]
+
+
+def predict_model(name, artifacts, X_eval):
+    if name == 'xgboost':
+        import xgboost as xgb
+        X_eval = X_eval if isinstance(X_eval, xgb.DMatrix) else xgb.DMatrix(X_eval)
+        return artifacts[0].predict(X_eval)
+    if name == 'linear':
+        return artifacts[0].predict(artifacts[1].transform(X_eval))
+    if name == 'polynomial':
+        return artifacts[0].predict(artifacts[2].transform(artifacts[1].transform(X_eval)))
+    return artifacts[0].predict(X_eval)
+
+
+def init_worker(directory, split_path, log_level):
+    """Map the cached matrix once per worker; pages are shared between workers."""
+    global X, y, splits
+    logging.getLogger().setLevel(log_level)
+    X = np.load(os.path.join(directory, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(directory, 'y.npy'), mmap_mode='r')
+    with np.load(split_path) as saved:
+        splits = dict(saved)
+
+
+@functools.lru_cache(maxsize=None)
+def fold_data(k):
+    """Gathered rows of CV fold `k`, reused by every trial this worker runs."""
+    train, valid = splits[f'fold{k}_train'], splits[f'fold{k}_valid']
+    return X[train], y[train], X[valid], y[valid]
+
+
+@functools.lru_cache(maxsize=None)
+def fold_dmatrix(k):
+    import xgboost as xgb
+    X_train, y_train, X_valid, _ = fold_data(k)
+    return xgb.DMatrix(X_train, label=y_train), xgb.DMatrix(X_valid)
+
+
+def run_trial(name, params, n_folds, seed):
+    """Mean validation MSE (log charges) of one candidate over the CV folds."""
+    start = time.perf_counter()
+    errors = []
+    for k in range(n_folds):
+        X_train, y_train, X_valid, y_valid = fold_data(k)
+        if name == 'xgboost':
+            X_train, X_valid = fold_dmatrix(k)
+        artifacts = fit_model(name, params, X_train, y_train, seed)
+        errors.append(float(np.mean((predict_model(name, artifacts, X_valid) - y_valid) ** 2)))
+    return name, params, float(np.mean(errors)), time.perf_counter() - start
+
+
+def holdout_metrics(y_true, y_pred):
+    residual = y_pred - y_true
+    charges_residual = np.expm1(y_pred) - np.expm1(y_true)
+    return {
+        'rmse_log': round(float(np.sqrt(np.mean(residual ** 2))), 6),
+        'mae_log': round(float(np.mean(np.abs(residual))), 6),
+        'r2_log': round(float(1 - np.sum(residual ** 2) / np.sum((y_true - y_true.mean()) ** 2)), 6),
+        'mae': round(float(np.mean(np.abs(charges_residual))), 2),
+        'rmse': round(float(np.sqrt(np.mean(charges_residual ** 2))), 2),
+    }
+
+
+def fit_final(name, params, seed, threads, paths):
+    """Refit on the whole training split, score the holdout split and write the artifacts."""
+    import joblib
+    start = time.perf_counter()
+    train, test = splits['train'], splits['test']
+    artifacts = fit_model(name, params, X[train], y[train], seed, threads)
+    fit_seconds = time.perf_counter() - start
+    metrics = holdout_metrics(y[test], predict_model(name, artifacts, X[test])) if len(test) else {}
+    for artifact, path in zip(artifacts, paths):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        if name == 'xgboost':
+            tmp_path += '.json'
+            artifact.save_model(tmp_path)
+        else:
+            joblib.dump(artifact, tmp_path)
+        os.replace(tmp_path, path)
+    return name, metrics, fit_seconds
+
+
+# Manifest
+
+def manifest_files(manifest_path, paths):
+    """Artifact paths as the manifest stores them: relative to its own directory."""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    return [os.path.relpath(os.path.abspath(path), base) for path in paths]
+
+
+def update_manifest(manifest_path, entries):
+    """Merge new entries into the model manifest; other model types keep their entry."""
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    manifest.update(entries)
+    tmp_path = f"{manifest_path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def run(args):
+    import prediction_handler as handler
+    names = list(handler.MODEL_LOADERS) if args.models == 'all' else [
+        name.strip() for name in args.models.split(',')
+    ]
+    unknown = [name for name in names if name not in handler.MODEL_LOADERS]
+    if unknown:
+        raise SystemExit(f"Unknown model types: {', '.join(unknown)}")
+    log_level = getattr(logging, args.log_level.upper())
+    logging.getLogger().setLevel(log_level)
+    version = args.version or time.strftime("v%Y%m%d-%H%M%S")
+    start = time.perf_counter()
+
+    directory, invalid = cached_matrix(args.data, args.cache_dir, handler)
+    n_rows = len(np.load(os.path.join(directory, 'y.npy'), mmap_mode='r'))
+    split_path = cached_splits(directory, n_rows, args.test_size, args.folds, args.search_rows, args.seed)
+    with np.load(split_path) as saved:
+        split_rows = {'train': len(saved['train']), 'holdout': len(saved['test'])}
+    print(f"{n_rows:,} training rows ({invalid:,} invalid rows skipped) in "
+          f"{time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    trials = [
+        (name, params)
+        for name in sorted(names, key=SCHEDULE_ORDER.index)
+        for params in sample_candidates(name, args.trials, args.seed)
+    ]
+    best = {}
+    search_seconds = dict.fromkeys(names, 0.0)
+    n_trials = dict.fromkeys(names, 0)
+    threads = max(1, (os.cpu_count() or 1) // max(1, min(args.workers, len(names))))
+    output_dir = os.path.join(args.model_dir, version)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: [os.path.join(output_dir, file) for file in handler.MODEL_FILES[name]] for name in names}
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(directory, split_path, log_level)) as pool:
+        search_start = time.perf_counter()
+        futures = [pool.submit(run_trial, name, params, args.folds, args.seed) for name, params in trials]
+        for done, future in enumerate(as_completed(futures), 1):
+            name, params, mse, seconds = future.result()
+            search_seconds[name] += seconds
+            n_trials[name] += 1
+            if name not in best or mse < best[name][1]:
+                best[name] = (params, mse)
+            print(f"\r{done}/{len(futures)} trials ({time.perf_counter() - search_start:.1f}s)",
+                  end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+
+        # Final fits: one per family, each with a share of the cores
+        futures = [
+            pool.submit(fit_final, name, best[name][0], args.seed, threads, paths[name])
+            for name in sorted(names, key=SCHEDULE_ORDER.index)
+        ]
+        finals = {}
+        for future in as_completed(futures):
+            name, metrics, fit_seconds = future.result()
+            finals[name] = (metrics, fit_seconds)
+
+    manifest_path = args.manifest or os.path.join(args.model_dir, 'model_manifest.json')
+    entries = {}
+    for name in names:
+        # The checksum the API will recompute when it loads these files
+        model = handler.MODEL_LOADERS[name]({}, paths[name])
+        metrics, fit_seconds = finals[name]
+        params, cv_mse = best[name]
+        entries[name] = {
+            'files': manifest_files(manifest_path, paths[name]),
+            'version': version,
+            'checksum': handler.prediction_checksum(model, handler.ModelType(name)),
+            'params': params,
+            'metrics': {**metrics, 'cv_mse_log': round(cv_mse, 6)},
+            'rows': split_rows,
+            # Lets retrain_xgboost.py rebuild a holdout this model never trained on
+            'split': {'seed': args.seed, 'test_size': args.test_size, 'rows': n_rows},
+            'trials': n_trials[name],
+            'search_cpu_seconds': round(search_seconds[name], 2),
+            'fit_seconds': round(fit_seconds, 2),
+            'trained_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+    update_manifest(manifest_path, entries)
+
+    elapsed = time.perf_counter() - start
+    for name in names:
+        metrics = entries[name]['metrics']
+        print(f"{name:>14}: holdout MAE {metrics.get('mae', float('nan')):,.2f}, "
+              f"R2 (log) {metrics.get('r2_log', float('nan')):.4f}  {entries[name]['params']}", file=sys.stderr)
+    print(f"Trained {', '.join(names)} as {version} in {elapsed:.2f}s -> {manifest_path}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the served insurance models")
+    parser.add_argument("data", nargs="?", default="insurance.csv",
+                        help="CSV/Parquet/Feather file, or a directory of them (default: insurance.csv)")
+    parser.add_argument("--models", default="all",
+                        help="Comma-separated model types, or 'all' (default: all)")
+    parser.add_argument("--model-dir", default=os.environ.get("MODEL_DIR", "."),
+                        help="Directory the versioned artifacts are written to (default: MODEL_DIR or .)")
+    parser.add_argument("--manifest", default=None,
+                        help="Manifest to update (default: MODEL_DIR/model_manifest.json)")
+    parser.add_argument("--version", default=None, help="Version name (default: v<timestamp>)")
+    parser.add_argument("--trials", type=int, default=40, help="Random-search candidates per model family")
+    parser.add_argument("--folds", type=int, default=3, help="CV folds per candidate")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Holdout fraction")
+    parser.add_argument("--search-rows", type=int, default=200000,
+                        help="Training rows the search runs on; final models use all of them")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Training processes")
+    parser.add_argument("--cache-dir", default=".train_cache", help="Encoded matrix and fold cache")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="warning")
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import numpy as np
+
+
+class FlatTreeEnsemble:
+    """Array-based evaluator for fitted sklearn regression trees and forests.
+
+    Every tree is flattened into shared contiguous arrays (feature, threshold,
+    children, value) and all trees are walked together, one vectorized step
+    per depth level, for the whole batch. Inputs are cast to float32 and leaf
+    values are accumulated tree by tree exactly as sklearn does, so
+    predictions are bit-identical to `estimator.predict`.
+    """
+
+    def __init__(self, feature, threshold, children, value, missing_left, roots, max_depth, average):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        self.max_depth = max_depth
+        self.average = average
+        self.n_trees = len(roots)
+        self.n_nodes = len(feature)
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Flatten a fitted DecisionTreeRegressor or RandomForestRegressor."""
+        if hasattr(estimator, 'estimators_'):
+            trees = [e.tree_ for e in estimator.estimators_]
+            average = True
+        else:
+            trees = [estimator.tree_]
+            average = False
+
+        for tree in trees:
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output regression trees are supported")
+
+        n_nodes = sum(tree.node_count for tree in trees)
+        feature = np.zeros(n_nodes, dtype=np.intp)
+        threshold = np.zeros(n_nodes, dtype=np.float64)
+        # children[2 * node] is the left child, children[2 * node + 1] the right one
+        children = np.zeros(2 * n_nodes, dtype=np.intp)
+        value = np.zeros(n_nodes, dtype=np.float64)
+        missing_left = np.zeros(n_nodes, dtype=bool)
+        roots = np.zeros(len(trees), dtype=np.intp)
+
+        offset = 0
+        max_depth = 0
+        for t, tree in enumerate(trees):
+            count = tree.node_count
+            nodes = np.arange(offset, offset + count)
+            is_leaf = tree.children_left == -1
+            roots[t] = offset
+            feature[nodes] = np.where(is_leaf, 0, tree.feature)
+            threshold[nodes] = tree.threshold
+            # Leaves point at themselves so extra steps are no-ops
+            children[2 * nodes] = np.where(is_leaf, nodes, tree.children_left + offset)
+            children[2 * nodes + 1] = np.where(is_leaf, nodes, tree.children_right + offset)
+            value[nodes] = tree.value[:, 0, 0]
+            if hasattr(tree, 'missing_go_to_left'):
+                missing_left[nodes] = np.asarray(tree.missing_go_to_left, dtype=bool)
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += count
+
+        return cls(feature, threshold, children, value, missing_left, roots, max_depth, average)
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_trees, n_rows)."""
+        return self._walk(X)
+
+    def _walk(self, X, on_split=None):
+        # on_split(flat_features, parents, children) sees every step, where
+        # flat_features indexes the split feature of each row in X.ravel()
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        X_flat = X.ravel()
+        has_missing = bool(np.isnan(X_flat).any())
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        row_offsets = None
+        if n_rows > 1:
+            row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[None, :]
+        for _ in range(self.max_depth):
+            features = self.feature.take(nodes)
+            if row_offsets is not None:
+                features += row_offsets
+            x = X_flat.take(features)
+            if has_missing:
+                # NaN fails `x <= threshold`; sklearn then follows missing_go_to_left
+                go_right = ~(x <= self.threshold.take(nodes))
+                go_right &= ~(np.isnan(x) & self.missing_left.take(nodes))
+            else:
+                go_right = x > self.threshold.take(nodes)
+            if on_split is None:
+                nodes *= 2
+                nodes += go_right
+                nodes = self.children.take(nodes)
+            else:
+                children = self.children.take(2 * nodes + go_right)
+                on_split(features, nodes, children)
+                nodes = children
+        return nodes
+
+    def predict(self, X):
+        leaf_values = self.value.take(self.apply(X))
+        if not self.average:
+            return leaf_values[0]
+        # Sum strictly in estimator order (cumsum never uses pairwise
+        # summation), then divide, matching sklearn's forest accumulation
+        prediction = np.cumsum(leaf_values, axis=0)[-1]
+        prediction /= self.n_trees
+        return prediction
+
+    def contributions(self, X):
+        """Per-feature path contributions, shape (n_rows, n_features), and the bias.
+
+        Every split moves the prediction from the parent's value to the
+        child's; that change is credited to the split feature (Saabas). The
+        bias is the root value, so bias + contributions.sum(axis=1) equals
+        `predict(X)` up to rounding. Forests average over trees.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        totals = np.zeros(n_rows * n_features, dtype=np.float64)
+
+        def credit(flat_features, parents, children):
+            # Leaves point at themselves, so finished paths add zero
+            delta = self.value.take(children) - self.value.take(parents)
+            np.add(totals, np.bincount(flat_features.ravel(), weights=delta.ravel(), minlength=totals.size),
+                   out=totals)
+
+        self._walk(X, credit)
+        contributions = totals.reshape(n_rows, n_features)
+        bias = float(self.value.take(self.roots).sum())
+        if self.average:
+            contributions /= self.n_trees
+            bias /= self.n_trees
+        return contributions, np.full(n_rows, bias)
+
+
+# Build rows that sit exactly on split thresholds (plus random rows) so the
+# comparison against sklearn exercises the `<=` ties and float32 casting
+def verification_matrix(engine, X_base, n_threshold_rows=256, seed=0):
+    rng = np.random.default_rng(seed)
+    internal = np.flatnonzero(engine.children[0::2] != np.arange(engine.n_nodes))
+    rows = [np.asarray(X_base, dtype=np.float64)]
+    if len(internal):
+        picked = rng.choice(internal, size=min(n_threshold_rows, len(internal)), replace=False)
+        X_ties = np.asarray(X_base, dtype=np.float64)[rng.integers(0, len(X_base), size=len(picked))].copy()
+        X_ties[np.arange(len(picked)), engine.feature[picked]] = engine.threshold[picked]
+        rows.append(X_ties)
+    return np.concatenate(rows, axis=0)
+
+
+# True when the flattened evaluator reproduces `estimator.predict` bit for bit
+# (forests must predict with n_jobs=1: threaded accumulation is not deterministic)
+def verify_engine(engine, estimator, X_base):
+    X = verification_matrix(engine, X_base)
+    expected = np.asarray(estimator.predict(X), dtype=np.float64)
+    actual = engine.predict(X)
+    return actual.shape == expected.shape and actual.tobytes() == expected.tobytes()